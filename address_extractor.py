@@ -0,0 +1,130 @@
+import ipaddress
+import re
+import socket
+from collections import namedtuple
+
+# Tokens following each interface address keyword: (address, prefix length or netmask)
+IPV4_MASK_LENGTH = re.compile(r"([\d.]+) mask-length (\d+)")
+IPV4_SLASH = re.compile(r"([\d.]+)/(\d+)")
+IPV4_NETMASK = re.compile(r"([\d.]+) (255\.[\d.]+)")
+IPV6_MASK_LENGTH = re.compile(r"([0-9A-Fa-f:.]+) mask-length (\d+)")
+IPV6_PREFIX = re.compile(r"([0-9A-Fa-f:.]+)[/ ](\d+)")
+
+MAX_PREFIXLEN = {4: 32, 6: 128}
+
+
+class InterfaceAddress(
+    namedtuple("InterfaceAddress", ["version", "address", "prefixlen"])
+):
+    """Interface address held as integers, ipaddress objects are only built when asked for"""
+
+    __slots__ = ()
+
+    @property
+    def max_prefixlen(self):
+        return MAX_PREFIXLEN[self.version]
+
+    @property
+    def network_address(self):
+        host_bits = self.max_prefixlen - self.prefixlen
+        return self.address >> host_bits << host_bits
+
+    @property
+    def sort_key(self):
+        # Ordered as ipaddress orders interfaces: by network, then by address
+        return self.version, self.network_address, self.prefixlen, self.address
+
+    @property
+    def interface(self):
+        if self.version == 4:
+            return ipaddress.IPv4Interface((self.address, self.prefixlen))
+        return ipaddress.IPv6Interface((self.address, self.prefixlen))
+
+    def __str__(self):
+        return self.interface.with_prefixlen
+
+
+def packed_ipv4(address):
+    """Fast path of IPv4Address(address).packed, None unless address is a canonical dotted quad"""
+    try:
+        packed = socket.inet_pton(socket.AF_INET, address)
+    except (OSError, TypeError):
+        return None
+    return packed if socket.inet_ntop(socket.AF_INET, packed) == address else None
+
+
+def ipv4_int(token):
+    """Converts a dotted quad to an integer, None unless it is one (no leading zeros, as ipaddress)"""
+    packed = packed_ipv4(token)
+    if packed is None:
+        return None
+    return int.from_bytes(packed, "big")
+
+
+def netmask_prefixlen(token):
+    """Converts a netmask such as 255.255.255.0 to its prefix length, None unless it is contiguous"""
+    netmask = ipv4_int(token)
+    if netmask is None:
+        return None
+    prefixlen = bin(netmask).count("1")
+    if netmask != (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF:
+        return None
+    return prefixlen
+
+
+def extract_ipv4_prefixlen(pattern):
+    """Extractor of an IPv4 address followed by its prefix length"""
+
+    def extract(output, position):
+        match = pattern.match(output, position)
+        if match is None:
+            return None
+        address = ipv4_int(match.group(1))
+        prefixlen = int(match.group(2))
+        if address is None or prefixlen > 32:
+            return None
+        return InterfaceAddress(4, address, prefixlen)
+
+    return extract
+
+
+def extract_ipv4_netmask(output, position):
+    """Extractor of an IPv4 address followed by its netmask"""
+    match = IPV4_NETMASK.match(output, position)
+    if match is None:
+        return None
+    address = ipv4_int(match.group(1))
+    prefixlen = netmask_prefixlen(match.group(2))
+    if address is None or prefixlen is None:
+        return None
+    return InterfaceAddress(4, address, prefixlen)
+
+
+def extract_ipv6_prefixlen(pattern):
+    """Extractor of an IPv6 address followed by its prefix length, link-local addresses have none"""
+
+    def extract(output, position):
+        match = pattern.match(output, position)
+        if match is None:
+            return None
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, match.group(1))
+        except OSError:
+            return None
+        prefixlen = int(match.group(2))
+        if prefixlen > 128:
+            return None
+        return InterfaceAddress(6, int.from_bytes(packed, "big"), prefixlen)
+
+    return extract
+
+
+# Interface address keyword: extractor(output, position after the keyword) returning an address or None
+ADDRESS_EXTRACTORS = {
+    "ipv4-address ": extract_ipv4_prefixlen(IPV4_MASK_LENGTH),
+    "inet address ": extract_ipv4_prefixlen(IPV4_SLASH),
+    "ip address ": extract_ipv4_netmask,
+    "ipv6-address ": extract_ipv6_prefixlen(IPV6_MASK_LENGTH),
+    "inet6 address ": extract_ipv6_prefixlen(IPV6_PREFIX),
+    "ipv6 address ": extract_ipv6_prefixlen(IPV6_PREFIX),
+}
@@ -0,0 +1,85 @@
+import ipaddress
+from bisect import bisect_left, bisect_right
+
+
+class AggregateIndex:
+    """Indexes public aggregates so the overlap for a network is found in O(log n) instead of a scan
+
+    Two CIDRs overlap only when one contains the other, so an aggregate overlapping a network either
+    contains it (looked up per indexed prefix length) or starts within it (a range of the sorted starts).
+    When several aggregates overlap, the first category and then the first aggregate listed wins.
+    """
+
+    def __init__(self, public_aggregates) -> None:
+        self.aggregates = []  # (category, aggregate) in priority order
+        # version: {prefixlen: {network >> host bits: rank}}
+        self.prefixes = {4: {}, 6: {}}
+        starts = {4: [], 6: []}  # version: [(network start, rank)]
+
+        for category, aggregates in public_aggregates.items():
+            for aggregate in aggregates:
+                rank = len(self.aggregates)
+                self.aggregates.append((category, aggregate))
+                network = ipaddress.ip_network(aggregate)
+                start = int(network.network_address)
+                key = start >> (network.max_prefixlen - network.prefixlen)
+                networks = self.prefixes[network.version].setdefault(
+                    network.prefixlen, {}
+                )
+                networks.setdefault(key, rank)
+                starts[network.version].append((start, rank))
+
+        self.starts = {}
+        self.rank_tables = {}
+        for version, version_starts in starts.items():
+            version_starts.sort()
+            self.starts[version] = [start for start, _ in version_starts]
+            # Sparse table answering "lowest rank between two positions" in constant time
+            rank_table = [[rank for _, rank in version_starts]]
+            width = 1
+            while width * 2 <= len(version_starts):
+                previous = rank_table[-1]
+                rank_table.append(
+                    [
+                        min(previous[index], previous[index + width])
+                        for index in range(len(previous) - width)
+                    ]
+                )
+                width *= 2
+            self.rank_tables[version] = rank_table
+
+    def __len__(self):
+        return len(self.aggregates)
+
+    def find_overlap(self, network):
+        """Returns (category, aggregate) of the highest priority aggregate overlapping network, or None"""
+        version = network.version
+        start = int(network.network_address)
+        end = int(network.broadcast_address)
+        best = None
+
+        # Aggregates containing the network
+        for prefixlen, networks in self.prefixes[version].items():
+            if prefixlen <= network.prefixlen:
+                rank = networks.get(start >> (network.max_prefixlen - prefixlen))
+                if rank is not None and (best is None or rank < best):
+                    best = rank
+
+        # Aggregates contained within the network
+        low = bisect_left(self.starts[version], start)
+        high = bisect_right(self.starts[version], end)
+        if low < high:
+            level = (high - low).bit_length() - 1
+            rank_table = self.rank_tables[version][level]
+            rank = min(rank_table[low], rank_table[high - (1 << level)])
+            if best is None or rank < best:
+                best = rank
+
+        return self.aggregates[best] if best is not None else None
+
+    def classify(self, network):
+        """Returns the public_overlap and public_overlap_cidr report values for a network"""
+        overlap = self.find_overlap(network)
+        if overlap is None:
+            return "No Issue", ""
+        return overlap
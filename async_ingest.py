@@ -0,0 +1,227 @@
+import asyncio
+import os
+import threading
+from collections import namedtuple
+from zipfile import ZipFile
+from console import error, print
+from config_parser import FileHandler, parse_device_config, slice_commands
+from config_parser import decode_capture, reference_name
+from file_processor import TaskPool, parse_device_commands, parse_site_name
+from profiler import profiler
+
+# A capture being collected: its file name and an async iterator of the raw output as it arrives
+Capture = namedtuple("Capture", "name chunks")
+
+# Captures are named as if the collector had written them to the input folder
+CAPTURE_FOLDER = "input/"
+
+
+def slice_capture(task):
+    """Worker: slices commands and parses the device configuration of a collected capture"""
+    name, site_name, content, command_list = task
+    # Not within a zip file even when the name includes one, so it is reported as is
+    ref_file = f"{CAPTURE_FOLDER}{name}"
+    with profiler.span("slice", "slice", file=name, bytes=len(content)):
+        command_hostname, commands_found = slice_commands(content, command_list)
+    with profiler.span("config", "config", file=name, bytes=len(content)):
+        device = parse_device_config(CAPTURE_FOLDER, ref_file, site_name, content)
+    return command_hostname, commands_found, device
+
+
+async def replay_chunks(orig_file, ref_file, chunk_size, delay):
+    if ".zip".lower() in orig_file:
+        with ZipFile(orig_file) as input_zip, input_zip.open(ref_file) as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+                await asyncio.sleep(delay)
+    else:
+        # Raw bytes, decoded and with their newlines translated once collected as process_files does
+        with open(orig_file, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+                await asyncio.sleep(delay)
+
+
+async def replay_captures(files_found, chunk_size=65536, delay=0.0):
+    """Stand-in collector replaying captures from files and zip members, chunk by chunk with a delay"""
+    for orig_file in files_found:
+        try:
+            file_handler = FileHandler(orig_file)
+            member_names = file_handler.member_names()
+            file_handler.close()
+        except Exception as e:
+            error("Ouch!", e.__class__, "occurred.")
+            continue
+        for ref_file in member_names:
+            yield Capture(
+                reference_name(orig_file, ref_file),
+                replay_chunks(orig_file, ref_file, chunk_size, delay),
+            )
+
+
+async def stream_chunks(reader, done, chunk_size=65536):
+    try:
+        while chunk := await reader.read(chunk_size):
+            yield chunk
+    finally:
+        done.set()
+
+
+async def queued_captures(queue, max_captures=None, idle_timeout=None):
+    """Yields captures from a queue until max_captures were received or none arrived for idle_timeout"""
+    received = 0
+    while max_captures is None or received < max_captures:
+        try:
+            capture = await asyncio.wait_for(queue.get(), idle_timeout)
+        except asyncio.TimeoutError:
+            return
+        received += 1
+        yield capture
+
+
+async def socket_captures(host, port, max_captures=None, idle_timeout=None):
+    """Accepts one capture per TCP connection: a first line holding its file name, then the raw output"""
+    queue = asyncio.Queue()
+
+    async def handle_connection(reader, writer):
+        name = (await reader.readline()).decode("utf-8", "replace").strip()
+        done = asyncio.Event()
+        await queue.put(Capture(name, stream_chunks(reader, done)))
+        # The connection stays open until the capture has been read
+        await done.wait()
+        writer.close()
+
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f"\n[bold green]Listening for captures on {host}:{port}\n")
+    async with server:
+        async for capture in queued_captures(queue, max_captures, idle_timeout):
+            yield capture
+
+
+def open_fifo(path):
+    """Opens a named pipe for reading without blocking the event loop until a writer connects"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def open_blocking():
+        try:
+            pipe = open(path, "rb", buffering=0)
+        except Exception as e:
+            loop.call_soon_threadsafe(future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(future.set_result, pipe)
+
+    # A daemon thread rather than the default executor, an idle wait must not keep the process alive
+    threading.Thread(target=open_blocking, daemon=True).start()
+    return future
+
+
+async def fifo_captures(path, max_captures=None, idle_timeout=None):
+    """Reads one capture per writer from a named pipe: a first line holding its file name, then the raw output"""
+    if not os.path.exists(path):
+        os.mkfifo(path)
+    loop = asyncio.get_running_loop()
+    print(f"\n[bold green]Reading captures from {path}\n")
+    received = 0
+    while max_captures is None or received < max_captures:
+        try:
+            pipe = await asyncio.wait_for(open_fifo(path), idle_timeout)
+        except asyncio.TimeoutError:
+            return
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe
+        )
+        name = (await reader.readline()).decode("utf-8", "replace").strip()
+        done = asyncio.Event()
+        received += 1
+        yield Capture(name, stream_chunks(reader, done))
+        # Writers take turns on a pipe, the next one is waited for once this capture was read
+        await done.wait()
+        transport.close()
+
+
+async def ingest_captures(
+    captures, command_list, jobs=1, concurrency=16, queue_size=32
+):
+    """Collects captures from an async source and parses each one as soon as it is complete
+
+    Up to concurrency captures are collected at once. Complete captures are decoded as files are, and
+    wait in a queue of queue_size for the parsing workers, so collection is held back when parsing falls
+    behind. Captures are matched with command output in the order they finish slicing, as files are in
+    process_files. Returns the same (sites, devices, command_contents, files_missing_site_name).
+    """
+    pool = TaskPool(jobs)
+    semaphore = asyncio.Semaphore(concurrency)
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    sites = []
+    files_missing_site_name = []
+    command_contents = {}
+    devices = []
+
+    async def collect(capture):
+        try:
+            try:
+                with profiler.span("collect", "collect", file=capture.name) as span:
+                    try:
+                        parts = [chunk async for chunk in capture.chunks]
+                    finally:
+                        await capture.chunks.aclose()
+                    # Decoded as a file of the input folder is, byte order marks and invalid bytes included
+                    content = decode_capture(
+                        b"".join(parts), capture.name, translate_newlines=True
+                    )
+                    span["bytes"] = len(content)
+            except Exception as e:
+                error("Ouch!", e.__class__, "occurred.")
+                return
+            # Waits here while the parsing workers are behind, keeping its slot so no other capture is collected
+            await queue.put((capture.name, content))
+        finally:
+            semaphore.release()
+
+    async def collect_all():
+        tasks = set()
+        async for capture in captures:
+            await semaphore.acquire()
+            print(f"\nCollecting {capture.name}...\n")
+            task = asyncio.create_task(collect(capture))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        for _ in range(pool.workers):
+            await queue.put(None)
+
+    async def parse():
+        while (item := await queue.get()) is not None:
+            name, content = item
+            site_name = parse_site_name(f"{CAPTURE_FOLDER}{name}")
+            if site_name is not None:
+                sites.append(site_name)
+            else:
+                site_name = ""
+                files_missing_site_name.append(name)
+            try:
+                command_hostname, commands_found, device = await pool.run(
+                    slice_capture, (name, site_name, content, command_list)
+                )
+            except Exception as e:
+                error("Ouch!", e.__class__, "occurred.")
+                continue
+            # Searches every capture for commands that we intend to parse
+            if commands_found:
+                command_contents[command_hostname] = commands_found
+            # Devices only see commands sliced from this capture or the captures before it
+            commands = command_contents.get(device.name)
+            if commands:
+                device = await pool.run(parse_device_commands, (device, commands, None))
+            devices.append(device)
+
+    try:
+        with profiler.span("ingest_captures", "run"):
+            await asyncio.gather(collect_all(), *[parse() for _ in range(pool.workers)])
+    finally:
+        pool.close()
+
+    return sites, devices, command_contents, files_missing_site_name
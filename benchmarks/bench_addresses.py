@@ -0,0 +1,137 @@
+import argparse
+import ipaddress
+import os
+import random
+import re
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from tabulate import tabulate
+from generate_captures import CAPTURE_GENERATORS, CaptureSizes
+from address_extractor import ADDRESS_EXTRACTORS
+from config_parser import config_scanner
+
+# The octet alternation regexes interface addresses were matched with before address_extractor
+OCTET = r"(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)"
+NETMASK_OCTET = r"(0|128|192|224|240|248|252|254|255)"
+IPV4_ADDRESS = rf"{OCTET}\.{OCTET}\.{OCTET}\.{OCTET}"
+REGEX_SIGNATURES = {
+    "ipv4-address ": (rf"{IPV4_ADDRESS} mask-length (\d+)", "{}.{}.{}.{}/{}"),
+    "inet address ": (rf"{IPV4_ADDRESS}\/(\d+)", "{}.{}.{}.{}/{}"),
+    "ip address ": (
+        rf"{IPV4_ADDRESS} (255)\.{NETMASK_OCTET}\.{NETMASK_OCTET}\.{NETMASK_OCTET}",
+        "{}.{}.{}.{}/{}.{}.{}.{}",
+    ),
+}
+
+# IPv4 interface address keyword of each generated platform
+IPV4_KEYWORDS = {
+    "cisco_ios": "ip address ",
+    "hp_comware": "ip address ",
+    "juniper_junos": "inet address ",
+    "checkpoint_gaia": "ipv4-address ",
+}
+
+
+def regex_extract(output, positions, keyword):
+    pattern, address_format = REGEX_SIGNATURES[keyword]
+    regex = re.compile(pattern)
+    addresses = []
+    for position in positions:
+        match = regex.match(output, position)
+        if match is not None:
+            addresses.append(
+                ipaddress.ip_interface(address_format.format(*match.groups()))
+            )
+    return addresses
+
+
+def extractor_extract(output, positions, keyword):
+    extract = ADDRESS_EXTRACTORS[keyword]
+    addresses = []
+    for position in positions:
+        interface = extract(output, position)
+        if interface is not None:
+            addresses.append(interface)
+    return addresses
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks interface address extraction against the octet regex path on large configs"
+    )
+    parser.add_argument(
+        "--interfaces", type=int, default=20000, help="interfaces per config"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the best is kept")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    args = parser.parse_args()
+
+    rows = []
+    for platform, keyword in IPV4_KEYWORDS.items():
+        rng = random.Random(args.seed)
+        output = "\n".join(
+            CAPTURE_GENERATORS[platform](
+                rng, "BENCH", CaptureSizes(args.interfaces, 0, 0, 0)
+            )
+        )
+        positions = [match.end() for match in re.finditer(re.escape(keyword), output)]
+        regex_seconds, regex_addresses = best_time(
+            lambda: regex_extract(output, positions, keyword), args.repeat
+        )
+        extractor_seconds, extractor_addresses = best_time(
+            lambda: extractor_extract(output, positions, keyword), args.repeat
+        )
+        # Both paths must find the same IPv4 addresses, IPv6 is only found by the extractor
+        if regex_addresses != [address.interface for address in extractor_addresses]:
+            raise SystemExit(
+                f"{platform}: extracted addresses differ from the regex path"
+            )
+        scan_seconds, config = best_time(
+            lambda: config_scanner.scan(output), args.repeat
+        )
+        rows.append(
+            [
+                platform,
+                f"{len(output) / 1024**2:.1f}",
+                len(regex_addresses),
+                round(regex_seconds * 1e3, 1),
+                round(extractor_seconds * 1e3, 1),
+                f"{regex_seconds / extractor_seconds:.1f}x",
+                len(config.int_addresses) - len(regex_addresses),
+                round(scan_seconds * 1e3, 1),
+            ]
+        )
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "platform",
+                "MB",
+                "IPv4",
+                "regex (ms)",
+                "extractor (ms)",
+                "speedup",
+                "IPv6",
+                "config scan (ms)",
+            ],
+            tablefmt="github",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import os
+import random
+from collections import namedtuple
+from zipfile import ZipFile, ZIP_DEFLATED
+
+VENDORS = ("cisco_ios", "hp_comware", "juniper_junos", "checkpoint_gaia")
+
+# Number of interfaces, routes, ARP entries and MAC entries generated per device
+CaptureSizes = namedtuple("CaptureSizes", "interfaces routes arp macs")
+
+
+def random_mac(rng, separator, group):
+    digits = f"{rng.getrandbits(48):012x}"
+    return separator.join(
+        digits[index : index + group] for index in range(0, 12, group)
+    )
+
+
+def random_network(rng, prefixlen=24):
+    # Mostly private space with the occasional public network so overlap classification has work to do
+    if rng.random() < 0.9:
+        address = (10 << 24) | rng.getrandbits(24)
+    else:
+        address = rng.randrange(1 << 24, 223 << 24)
+    host_bits = 32 - prefixlen
+    network = address >> host_bits << host_bits
+    return ".".join(str(network >> shift & 255) for shift in (24, 16, 8, 0))
+
+
+def host_address(network, host=1):
+    octets = network.split(".")
+    return ".".join(octets[:3] + [str(int(octets[3]) + host)])
+
+
+def ipv6_host_address(index):
+    # Every other interface is dual stacked, derived from its index so the random sequence is unchanged
+    return f"2001:db8:{index:x}::1" if index % 2 == 0 else None
+
+
+def cisco_ios_capture(rng, hostname, sizes):
+    lines = [f"{hostname}#show running-config", "!", f"hostname {hostname}", "!"]
+    lines += ["ip dhcp pool USERS", " network 10.0.0.0 255.255.255.0", "!"]
+    networks = [random_network(rng) for _ in range(sizes.interfaces)]
+    for index, network in enumerate(networks):
+        lines += [
+            f"interface GigabitEthernet0/{index}",
+            f" ip address {host_address(network)} 255.255.255.0",
+            " ip nat inside" if index else " ip nat outside",
+        ]
+        if ipv6_host_address(index):
+            lines.append(f" ipv6 address {ipv6_host_address(index)}/64")
+        lines.append("!")
+    lines += ["end", f"{hostname}#show ip route"]
+    lines += ["Codes: L - local, C - connected, S - static, O - OSPF", ""]
+    lines += ["Gateway of last resort is not set", ""]
+    for index, network in enumerate(networks[: sizes.routes]):
+        lines.append(
+            f"C        {network}/24 is directly connected, GigabitEthernet0/{index}"
+        )
+    for _ in range(sizes.routes - len(networks[: sizes.routes])):
+        lines.append(
+            f"O        {random_network(rng)}/24 [110/2] via {host_address(networks[0], 254)}, 00:01:02, GigabitEthernet0/0"
+        )
+    lines += [f"{hostname}#exit", ""]
+    return lines
+
+
+def hp_comware_capture(rng, hostname, sizes):
+    lines = [f"<{hostname}>display current-configuration", "#", f" sysname {hostname}"]
+    lines += ["#", " dhcp server ip-pool USERS", "#"]
+    networks = [random_network(rng) for _ in range(sizes.interfaces)]
+    for index, network in enumerate(networks):
+        lines += [
+            f"interface Vlan-interface{index + 1}",
+            f" ip address {host_address(network)} 255.255.255.0",
+        ]
+        if ipv6_host_address(index):
+            lines.append(f" ipv6 address {ipv6_host_address(index)} 64")
+        lines.append("#")
+    lines += [f"<{hostname}>display arp", "  Type: S-Static   D-Dynamic"]
+    lines.append(
+        "IP address      MAC address    VLAN     Interface                Aging Type"
+    )
+    for index in range(sizes.arp):
+        address = host_address(networks[index % len(networks)], index % 253 + 1)
+        lines.append(
+            f"{address:<15} {random_mac(rng, '-', 4)} {index % 4094 + 1:<8} GE1/0/{index % 48 + 1:<18} 1193  D"
+        )
+    lines += [f"<{hostname}>display ip routing-table", "Routing Tables: Public"]
+    lines += [f"         Destinations : {sizes.routes}        Routes : {sizes.routes}"]
+    lines += [
+        "",
+        "Destination/Mask    Proto  Pre  Cost         NextHop         Interface",
+    ]
+    lines.append("")
+    for _ in range(sizes.routes):
+        lines.append(
+            f"{random_network(rng) + '/24':<19} Static 60   0            {host_address(networks[0], 254):<15} Vlan1"
+        )
+    lines += ["", f"<{hostname}>display mac-address"]
+    lines.append(
+        "MAC ADDR          VLAN ID   STATE          PORT INDEX               AGING TIME(s)"
+    )
+    for index in range(sizes.macs):
+        lines.append(
+            f"{random_mac(rng, '-', 4)}    {index % 4094 + 1:<9} Learned        GigabitEthernet1/0/{index % 48 + 1:<6} AGING"
+        )
+    lines += [f"<{hostname}>quit", ""]
+    return lines
+
+
+def juniper_junos_capture(rng, hostname, sizes):
+    lines = [f"admin@{hostname}> show configuration | display set"]
+    lines.append(f"set system host-name {hostname}")
+    networks = [random_network(rng) for _ in range(sizes.interfaces)]
+    for index, network in enumerate(networks):
+        lines.append(
+            f"set interfaces ge-0/0/{index} unit 0 family inet address {host_address(network)}/24"
+        )
+        if ipv6_host_address(index):
+            lines.append(
+                f"set interfaces ge-0/0/{index} unit 0 family inet6 address {ipv6_host_address(index)}/64"
+            )
+    lines += ["set security nat source pool SNAT", "", f"admin@{hostname}> show route"]
+    lines += ["", "inet.0: 2 destinations, 2 routes (2 active, 0 holddown, 0 hidden)"]
+    lines.append("+ = Active Route, - = Last Active, * = Both")
+    lines.append("")
+    for _ in range(sizes.routes):
+        lines += [
+            f"{random_network(rng)}/24       *[Static/5] 1w0d 00:00:01",
+            f"                    >  to {host_address(networks[0], 254)} via ge-0/0/0.0",
+        ]
+    lines += [f"admin@{hostname}> exit", ""]
+    return lines
+
+
+def checkpoint_gaia_capture(rng, hostname, sizes):
+    lines = [f"[Expert@{hostname}:0]# clish -c 'show configuration'"]
+    lines.append(f"set hostname {hostname}")
+    networks = [random_network(rng) for _ in range(sizes.interfaces)]
+    for index, network in enumerate(networks):
+        lines.append(
+            f"set interface eth{index} ipv4-address {host_address(network)} mask-length 24"
+        )
+        if ipv6_host_address(index):
+            lines.append(
+                f"set interface eth{index} ipv6-address {ipv6_host_address(index)} mask-length 64"
+            )
+    lines += ["set nat-pool 192.0.2.0/24", f"{hostname}> show route"]
+    lines += ["Codes: C - Connected, S - Static, O - OSPF", ""]
+    for _ in range(sizes.routes):
+        lines.append(
+            f"S         {random_network(rng) + '/24':<19} via {host_address(networks[0], 254)}, eth0, cost 0, age 123"
+        )
+    lines += [f"{hostname}> exit", ""]
+    return lines
+
+
+CAPTURE_GENERATORS = {
+    "cisco_ios": cisco_ios_capture,
+    "hp_comware": hp_comware_capture,
+    "juniper_junos": juniper_junos_capture,
+    "checkpoint_gaia": checkpoint_gaia_capture,
+}
+
+
+def generate_captures(
+    output,
+    devices=100,
+    sizes=CaptureSizes(8, 50, 100, 100),
+    vendors=VENDORS,
+    devices_per_zip=0,
+    seed=1,
+    line_ending="\r\n",
+):
+    """Writes synthetic device captures into output, returning the list of files written
+
+    Devices cycle through vendors and are spread over ten sites. When devices_per_zip is set, captures are
+    bundled into zip files of that many members instead of being written as individual files.
+    """
+    rng = random.Random(seed)
+    os.makedirs(output, exist_ok=True)
+    files_written = []
+    bundle = None
+    for index in range(devices):
+        vendor = vendors[index % len(vendors)]
+        hostname = f"{vendor.split('_')[-1].upper()}-{index:05d}"
+        site = f"SITE{index % 10:02d}"
+        capture = line_ending.join(CAPTURE_GENERATORS[vendor](rng, hostname, sizes))
+        if devices_per_zip:
+            if index % devices_per_zip == 0:
+                if bundle is not None:
+                    bundle.close()
+                path = os.path.join(
+                    output, f"{site} - bundle{index // devices_per_zip:05d}.zip"
+                )
+                bundle = ZipFile(path, "w", compression=ZIP_DEFLATED)
+                files_written.append(path)
+            bundle.writestr(f"captures/{hostname}.log", capture)
+        else:
+            path = os.path.join(output, f"{site} - {hostname}.log")
+            with open(path, "w", newline="") as f:
+                f.write(capture)
+            files_written.append(path)
+    if bundle is not None:
+        bundle.close()
+    return files_written
+
+
+def add_generator_arguments(parser):
+    parser.add_argument("--devices", type=int, default=100, help="devices generated")
+    parser.add_argument(
+        "--interfaces", type=int, default=8, help="interfaces per device config"
+    )
+    parser.add_argument("--routes", type=int, default=50, help="routes per device")
+    parser.add_argument(
+        "--arp", type=int, default=100, help="ARP entries per device (HP Comware)"
+    )
+    parser.add_argument(
+        "--macs", type=int, default=100, help="MAC entries per device (HP Comware)"
+    )
+    parser.add_argument(
+        "--vendors",
+        nargs="+",
+        choices=VENDORS,
+        default=list(VENDORS),
+        help="platforms the devices cycle through",
+    )
+    parser.add_argument(
+        "--devices-per-zip",
+        type=int,
+        default=0,
+        help="bundle captures into zip files of this many devices (default: individual files)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+
+
+def generator_options(args):
+    return {
+        "devices": args.devices,
+        "sizes": CaptureSizes(args.interfaces, args.routes, args.arp, args.macs),
+        "vendors": args.vendors,
+        "devices_per_zip": args.devices_per_zip,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generates synthetic Cisco IOS, HP Comware, Juniper Junos and Check Point Gaia captures"
+    )
+    parser.add_argument("output", help="directory the captures are written to")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    files_written = generate_captures(args.output, **generator_options(args))
+    print(f"{len(files_written)} files written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
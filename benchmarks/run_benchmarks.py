@@ -0,0 +1,307 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from tabulate import tabulate
+from generate_captures import add_generator_arguments, generator_options
+from generate_captures import generate_captures
+from aggregate_index import AggregateIndex
+from config_parser import FileHandler, parse_commands, parse_device_config
+from config_parser import slice_commands
+from constants import COMMAND_LIST, PARSER_VERSION
+from file_processor import process_files
+from network_table import NetworkTable, NetworkTableBuilder
+from parse_cache import template_set_version
+from route_normalizer import route_normalizer
+from template_engine import parse_batch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb(who="self"):
+    if resource is None:
+        return None
+    usage = resource.getrusage(
+        resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN
+    )
+    # ru_maxrss is reported in bytes on macOS and kilobytes everywhere else
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss * scale / 1024**2, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class StageTimer:
+    """Records the best wall clock time of each stage over repeated runs"""
+
+    def __init__(self) -> None:
+        self.seconds = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        # Parsers report progress to the console, which would otherwise dominate the timings
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+        elapsed = time.perf_counter() - start
+        self.seconds[name] = min(elapsed, self.seconds.get(name, elapsed))
+
+
+def run_stages(timer, files_found, aggregate_index, jobs):
+    """Runs each parsing stage over the corpus in turn, returning (captures, bytes read)"""
+    with timer.stage("read"):
+        captures = []
+        for orig_file in files_found:
+            match_site_name = re.search(r".*\/(.*) -", orig_file)
+            site_name = match_site_name.group(1) if match_site_name else ""
+            file_handler = FileHandler(orig_file)
+            for ref_file in file_handler.member_names():
+                captures.append(
+                    (orig_file, ref_file, site_name, file_handler.read_member(ref_file))
+                )
+            file_handler.close()
+
+    with timer.stage("slice"):
+        command_contents = {}
+        for orig_file, ref_file, site_name, content in captures:
+            command_hostname, commands_found = slice_commands(content, COMMAND_LIST)
+            if commands_found:
+                command_contents[command_hostname] = commands_found
+
+    with timer.stage("config"):
+        devices = [
+            parse_device_config(orig_file, ref_file, site_name, content)
+            for orig_file, ref_file, site_name, content in captures
+        ]
+
+    with timer.stage("commands"):
+        devices = [
+            (
+                parse_commands(device, command_contents[device.name])
+                if command_contents.get(device.name)
+                else device
+            )
+            for device in devices
+        ]
+
+    with timer.stage("templates"):
+        # The sliced command outputs parsed in batches per (platform, command)
+        platforms = {device.name: device.platform for device in devices}
+        batches = defaultdict(list)
+        for hostname, commands in command_contents.items():
+            for command, output in commands.items():
+                batches[(platforms.get(hostname), command)].append(output)
+        for (platform_name, command), outputs in batches.items():
+            parse_batch(platform_name, command, outputs)
+
+    with timer.stage("network_table"):
+        interface_ips = NetworkTableBuilder()
+        route_networks = NetworkTableBuilder()
+        for device in devices:
+            for interface in device.sorted_int_addresses:
+                interface_ips.add_interface(interface, device)
+            routes = route_normalizer.normalize(device.routes, device.platform)
+            route_networks.add_networks(4, *routes.sorted_networks(), device)
+        networks_table = NetworkTable.concat(
+            [interface_ips.build(), route_networks.build()]
+        )
+        networks_table.classify_public_overlap(aggregate_index)
+        networks_table.classify_address_types()
+        networks_table.sorted().report()
+
+    with timer.stage("process_files"):
+        process_files(files_found, COMMAND_LIST, jobs=jobs)
+
+    return len(captures), sum(len(content) for *_, content in captures)
+
+
+def run_parser(timer, work_dir, jobs):
+    """Times a complete run of run_parser.py, report writing included, in its own process"""
+    with timer.stage("run_parser"):
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.join(REPO_DIR, "run_parser.py"),
+                "--no-cache",
+                "--jobs",
+                str(jobs),
+            ],
+            cwd=work_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+
+
+def cold_start(timer, files_found):
+    """Times fresh interpreters importing the parser and parsing a single capture, as automation calls it"""
+    file_handler = FileHandler(files_found[0])
+    ref_file = file_handler.member_names()[0]
+    content = file_handler.read_member(ref_file)
+    file_handler.close()
+    with timer.stage("cold_import"):
+        subprocess.run(
+            [sys.executable, "-c", "import run_parser"], cwd=REPO_DIR, check=True
+        )
+    with timer.stage("cold_single_capture"):
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from console import console; from file_processor import parse_capture; "
+                f"console.set_mode('quiet'); parse_capture(sys.stdin.read(), {os.path.basename(ref_file)!r})",
+            ],
+            cwd=REPO_DIR,
+            input=content,
+            text=True,
+            check=True,
+        )
+
+
+def compare_results(previous, current):
+    rows = []
+    for stage, result in current["stages"].items():
+        before = previous.get("stages", {}).get(stage, {}).get("seconds")
+        change = f"{(result['seconds'] - before) / before:+.1%}" if before else "n/a"
+        rows.append([stage, before, result["seconds"], change])
+    return tabulate(
+        rows,
+        headers=["stage", "previous (s)", "current (s)", "change"],
+        tablefmt="github",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the parser against a synthetic multi-vendor capture corpus"
+    )
+    add_generator_arguments(parser)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="worker processes (default: 1)"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs per stage, the best time is kept (default: 3)",
+    )
+    parser.add_argument(
+        "--output",
+        help="JSON results file (default: benchmarks/results/<timestamp>.json)",
+    )
+    parser.add_argument(
+        "--compare", help="previous JSON results file to compare stage timings with"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the generated corpus directory"
+    )
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="parser-benchmark-")
+    input_dir = os.path.join(work_dir, "input")
+    shutil.copytree(os.path.join(REPO_DIR, "vars"), os.path.join(work_dir, "vars"))
+    timer = StageTimer()
+    try:
+        with timer.stage("generate"):
+            files_found = generate_captures(input_dir, **generator_options(args))
+        with open(os.path.join(REPO_DIR, "vars", "public_aggregates.json")) as f:
+            aggregate_index = AggregateIndex(json.load(f))
+        for _ in range(args.repeat):
+            captures, bytes_read = run_stages(
+                timer, files_found, aggregate_index, args.jobs
+            )
+        harness_rss = peak_rss_mb("self")
+        for _ in range(args.repeat):
+            run_parser(timer, work_dir, args.jobs)
+            cold_start(timer, files_found)
+    finally:
+        if args.keep:
+            print(f"Corpus kept in {input_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parser_version": PARSER_VERSION,
+        "ntc_templates": template_set_version(),
+        "corpus": {
+            **{
+                key: value._asdict() if hasattr(value, "_asdict") else value
+                for key, value in generator_options(args).items()
+            },
+            "files": len(files_found),
+            "captures": captures,
+            "bytes": bytes_read,
+        },
+        "jobs": args.jobs,
+        "repeat": args.repeat,
+        "peak_rss_mb": {"harness": harness_rss, "run_parser": peak_rss_mb("children")},
+        "stages": {},
+    }
+    for stage, seconds in timer.seconds.items():
+        results["stages"][stage] = {
+            "seconds": round(seconds, 4),
+            "files_per_sec": round(captures / seconds, 1) if seconds else None,
+            "mb_per_sec": round(bytes_read / 1024**2 / seconds, 2) if seconds else None,
+        }
+
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, "results", f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(
+        f"{captures} captures in {len(files_found)} files, {bytes_read / 1024**2:.1f} MB, "
+        f"peak RSS {results['peak_rss_mb']['harness']} MB (harness), "
+        f"{results['peak_rss_mb']['run_parser']} MB (run_parser)\n"
+    )
+    print(
+        tabulate(
+            [[stage, *result.values()] for stage, result in results["stages"].items()],
+            headers=["stage", "seconds", "files/sec", "MB/sec"],
+            tablefmt="github",
+        )
+    )
+    if args.compare:
+        with open(args.compare) as f:
+            print(f"\nCompared with {args.compare}:\n")
+            print(compare_results(json.load(f), results))
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
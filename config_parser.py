@@ -1,234 +1,442 @@
-import ipaddress
+import codecs
+import mmap
+import os
 import re
+from collections import namedtuple
+from functools import lru_cache
+from itertools import islice
 from zipfile import ZipFile
-from ntc_templates.parse import parse_output
-from rich import print
+from console import console, error, print
+from address_extractor import ADDRESS_EXTRACTORS
+from profiler import profiler
+from template_engine import EMPTY_TABLE, compile_template, parse_table
+
+
+def reference_name(orig_file, ref_file):
+    """Returns the name reported for a file, relative to the input folder and including any zip name"""
+    if ".zip".lower() in orig_file:
+        return f"{orig_file[6:]}/{ref_file}"
+    return ref_file[6:]
+
+
+# Encodings announced by a byte order mark, captures without one are read as UTF-8
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def decode_capture(data, name="capture", translate_newlines=False):
+    """Decodes a capture held in bytes or any buffer, such as a memory map, in a single pass
+
+    Captures that are not valid in their encoding are decoded with the undecodable bytes replaced rather
+    than dropped, configurations and command output are ASCII. translate_newlines turns \\r\\n and \\r line
+    endings into \\n as reading in text mode does.
+    """
+    for byte_order_mark, encoding in BYTE_ORDER_MARKS:
+        if data[: len(byte_order_mark)] == byte_order_mark:
+            break
+    else:
+        encoding = "utf-8"
+    try:
+        output = str(data, encoding)
+    except UnicodeDecodeError:
+        error(
+            f"[bold yellow]{name} is not valid {encoding}, undecodable bytes were replaced"
+        )
+        output = str(data, encoding, "replace")
+    if translate_newlines and "\r" in output:
+        output = output.replace("\r\n", "\n").replace("\r", "\n")
+    return output
+
+
+class MmapReader:
+    """Read-only memory map of a file, its buffer is decoded without copying the file into memory first"""
+
+    def __init__(self, input_file) -> None:
+        with open(input_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                # Empty files cannot be memory mapped
+                self.buffer = b""
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
 
 
 class FileHandler:
-    """This class is responsible for file handling functions such as loading and unzipping"""
+    """This class is responsible for file handling functions such as loading and unzipping
+
+    Members are read one at a time by read_member, so a single member is held in memory at a time
+    """
 
     def __init__(self, input_file) -> None:
-        print(f"\nLoading {input_file}...\n")
-        if ".zip" in input_file.lower():
-            self.input_file = ZipFile(input_file)
-            self.name = {
-                name: self.input_file.read(name)
-                for name in self.input_file.namelist()
-                if name[-1] != "/"
-            }
-        else:
-            try:
-                with open(input_file) as self.f:
-                    self.name = {input_file: self.f.read()}
-            except Exception as e:
-                print("Ouch!", e.__class__, "occurred.")
+        self.path = input_file
+        self.is_zip = ".zip" in input_file.lower()
+        self.input_file = ZipFile(input_file) if self.is_zip else None
+
+    def member_names(self):
+        if self.is_zip:
+            return [name for name in self.input_file.namelist() if name[-1] != "/"]
+        return [self.path]
+
+    def read_member(self, member_name):
+        """Returns the text of a member, decoded once from the decompressed bytes or the memory map"""
+        if self.is_zip:
+            return decode_capture(
+                self.input_file.read(member_name), f"{self.path}/{member_name}"
+            )
+        reader = MmapReader(member_name)
+        try:
+            # Plain files have their newlines translated as in text mode
+            return decode_capture(reader.buffer, member_name, translate_newlines=True)
+        finally:
+            reader.close()
+
+    def close(self):
+        if self.is_zip:
+            self.input_file.close()
 
     def __str__(self):
-        return self.name
+        return self.path
 
 
-class CommandSlicer:
-    """Takes in file output, searches for device commands, and slices them accordingly"""
+CommandBlock = namedtuple("CommandBlock", ["command", "hostname", "start", "end"])
 
-    def __init__(self, orig_file, ref_file, site, output, command_list) -> None:
-        if ".zip".lower() in orig_file:
-            self.ref_file = f"{orig_file[6:]}/{ref_file}"
-        else:
-            self.ref_file = ref_file[6:]
 
-        self.site = site
+class CommandScanner:
+    """Compiles a list of commands into a single pattern and slices command blocks in one pass"""
+
+    # A prompt line such as "<SW1>display arp", "admin@MX1> show route" or "RTR1#show ip route"
+    prompt_regex = re.compile(
+        r"^(?:.*(?:[@<]|[^\S\n])|(?=[\w-]+[#>]))(?!command)([\w-]*)[#>].*", re.MULTILINE
+    )
+    prompt_marker_regex = re.compile(r"[#>]")
+
+    def __init__(self, command_list) -> None:
+        self.command_list = list(command_list)
+        self.command_regexes = {}
+        for command in self.command_list:
+            command_minimized = [word[:2] + r"[\w-]*\s*" for word in command.split()]
+            self.command_regexes[command] = re.compile(" ".join(command_minimized))
+        # Prompt lines are only checked against individual commands if the alternation matches
+        self.any_command_regex = re.compile(
+            "|".join(f"(?:{regex.pattern})" for regex in self.command_regexes.values())
+        )
+
+    def iter_prompts(self, output):
+        """Yields prompt line matches, only visiting lines that contain a prompt marker"""
+        marker = self.prompt_marker_regex.search(output)
+        while marker is not None:
+            line_start = output.rfind("\n", 0, marker.start()) + 1
+            line_end = output.find("\n", marker.start())
+            if line_end == -1:
+                line_end = len(output)
+            prompt = self.prompt_regex.match(output, line_start, line_end)
+            if prompt is not None:
+                yield prompt
+            marker = self.prompt_marker_regex.search(output, line_end + 1)
+
+    def scan(self, output):
+        """Returns the first block found for each command as (command, hostname, start, end) offsets"""
+        blocks = {}
+        pending = []
+        for prompt in self.iter_prompts(output):
+            # A prompt line closes any block still open above it
+            for command, hostname, start in pending:
+                blocks[command] = CommandBlock(
+                    command, hostname, start, prompt.start() - 1
+                )
+            pending = []
+            if len(blocks) == len(self.command_regexes):
+                break
+            prompt_line = prompt.group(0)
+            if not self.any_command_regex.search(prompt_line):
+                continue
+            for command, command_regex in self.command_regexes.items():
+                if command not in blocks and command_regex.search(prompt_line):
+                    pending.append((command, prompt.group(1), prompt.end() + 1))
+        for command, hostname, start in pending:
+            blocks[command] = CommandBlock(command, hostname, start, len(output))
+        return [blocks[command] for command in self.command_list if command in blocks]
+
+
+@lru_cache(maxsize=8)
+def get_command_scanner(command_list):
+    return CommandScanner(command_list)
+
+
+SlicedCommands = namedtuple("SlicedCommands", ["hostname", "commands_found"])
+
+
+def slice_commands(output, command_list):
+    """Searches file output for device commands and slices them accordingly
+
+    Returns the hostname of the last prompt a command was found at (None when no command was found) and a
+    dict of command: sliced output.
+    """
+    command_hostname = None
+    commands_found = {}
+    for block in get_command_scanner(tuple(command_list)).scan(output):
+        command_hostname = block.hostname
+        commands_found[block.command] = output[
+            block.start : max(block.start, block.end)
+        ]
+    return SlicedCommands(command_hostname, commands_found)
+
+
+# Platforms in order of precedence: (platform, hostname keyword, IPv4 and IPv6 interface address keywords)
+# Vendors are added here, every signature is detected within the same pass over the configuration
+PLATFORM_SIGNATURES = [
+    ("checkpoint_gaia", "set hostname ", ("ipv4-address ", "ipv6-address ")),
+    # Juniper hostname identification can vary depending on failover policy
+    ("juniper_junos", "system host-name ", ("inet address ", "inet6 address ")),
+    ("hp_comware", "sysname ", ("ip address ", "ipv6 address ")),
+    ("cisco_ios", "hostname ", ("ip address ", "ipv6 address ")),
+]
+
+# Interface addresses collected when no platform could be identified
+DEFAULT_ADDRESS_KEYWORDS = ("ip address ", "ipv6 address ")
+
+FEATURE_SIGNATURES = {
+    # Determine if device is running a DHCP Server
+    "dhcp_server": ["dhcp pool", "dhcp server ip-pool"],
+    # Determine if device has NAT configuration
+    "nat": [
+        "nat static",
+        "nat outbound",
+        "ip nat inside",
+        "ip nat outside",
+        "set nat-pool",
+        "set source pool",
+        "set destination pool",
+        "set static rule-set",
+    ],
+}
+
+ConfigScan = namedtuple(
+    "ConfigScan",
+    ["name", "missing_hostname", "platform", "int_addresses", "features"],
+)
 
-        self_command_regex_dict = {}
 
-        for self.command in command_list:
-            self.command_minimized = []
-            for self.command_word in self.command.split():
-                self.command_minimized.append(self.command_word[:2] + r"[\w-]*\s*")
-            self_command_regex_dict[self.command] = " ".join(self.command_minimized)
+class ConfigScanner:
+    """Finds the hostname, platform, interface addresses and features of a configuration in one pass
 
-        self.hostname_regex = r"^.*[@<\s](?!command)([\w-]*)[#>].*"
-        self.commands_found = {}
+    Every signature keyword is compiled into one alternation without capture groups, which keeps the
+    regex engine's first character skipping. Keyword hits are then dispatched to the matching signature.
+    """
 
-        for self.command, self.command_regex in self_command_regex_dict.items():
-            self.regex_combined = f"{self.hostname_regex}({self.command_regex})"
-            self.match_command_output = re.search(
-                self.regex_combined, output, flags=re.MULTILINE
+    hostname_regex = re.compile(r"[\w-]*")
+    unknown_hostname_regex = re.compile(
+        r"^.*[@<\s](?!command)(\w*)[#>].*", flags=re.MULTILINE
+    )
+
+    def __init__(
+        self, platform_signatures, address_extractors, feature_signatures
+    ) -> None:
+        self.platform_signatures = platform_signatures
+        self.address_extractors = address_extractors
+        self.keywords = {}
+        self.platform_address_keywords = {}
+        for platform, hostname_keyword, address_keywords in platform_signatures:
+            self.platform_address_keywords[platform] = address_keywords
+            self.keywords[hostname_keyword] = ("hostname", platform)
+            for address_keyword in address_keywords:
+                self.keywords[address_keyword] = ("address", address_keyword)
+        for feature, feature_keywords in feature_signatures.items():
+            for keyword in feature_keywords:
+                self.keywords[keyword] = ("feature", feature)
+        self.keyword_regex = re.compile(
+            "|".join(
+                re.escape(keyword)
+                for keyword in sorted(self.keywords, key=len, reverse=True)
             )
-            if self.match_command_output is not None:
-                self.command_hostname = self.match_command_output.group(1)
-                for self.index, self.line in enumerate(output.split("\n")):
-                    if re.search(self.regex_combined, self.line):
-                        self.top_sliced_output = output.split("\n")[self.index + 1 :]
-                        break
-                    else:
-                        self.top_sliced_output = output.split("\n")
-                self.sliced_command_list = []
-                for self.index, self.line in enumerate(self.top_sliced_output):
-                    if not re.search(self.hostname_regex, self.line):
-                        self.sliced_command_list.append(self.line)
-                    else:
-                        break
-                self.sliced_command_output = "\n".join(self.sliced_command_list)
-                self.commands_found[self.command] = str(self.sliced_command_output)
-
-
-class DeviceConfigParser:
-    """Represents network device and associated attributes"""
-
-    def __init__(self, orig_file, ref_file, site, output, **command_contents) -> None:
-        if ".zip".lower() in orig_file:
-            self.ref_file = f"{orig_file[6:]}/{ref_file}"
-        else:
-            self.ref_file = ref_file[6:]
-        self.site = site
-        self.routes = []
-        self.arp = []
-        self.macs = []
-
-        # Parse Device Name from Device Configuration
-        self.match_name_checkpoint_gaia = re.search(r"set hostname ([\w-]*)", output)
-        # Juniper hostname identification can vary depending on failover policy
-        self.match_name_juniper_junos = re.search(r"system host-name ([\w-]*)", output)
-        self.match_name_hp_comware = re.search(r"sysname ([\w-]*)", output)
-        self.match_name_cisco_ios = re.search(r"hostname ([\w-]*)", output)
-
-        if self.match_name_checkpoint_gaia is not None:
-            self.name = str(self.match_name_checkpoint_gaia.group(1))
-            self.missing_hostname = False
-            self.platform = "checkpoint_gaia"
-        elif self.match_name_juniper_junos is not None:
-            self.name = str(self.match_name_juniper_junos.group(1))
-            self.missing_hostname = False
-            self.platform = "juniper_junos"
-        elif self.match_name_hp_comware is not None:
-            self.name = str(self.match_name_hp_comware.group(1))
-            self.missing_hostname = False
-            self.platform = "hp_comware"
-        elif self.match_name_cisco_ios is not None:
-            self.name = str(self.match_name_cisco_ios.group(1))
-            self.missing_hostname = False
-            self.platform = "cisco_ios"
+        )
+
+    def scan(self, output):
+        hostnames = {}  # platform: first hostname found
+        address_positions = {}  # address keyword: [offsets following the keyword]
+        features = set()
+        for match in self.keyword_regex.finditer(output):
+            kind, value = self.keywords[match.group()]
+            if kind == "address":
+                address_positions.setdefault(value, []).append(match.end())
+            elif kind == "hostname":
+                if value not in hostnames:
+                    hostnames[value] = self.hostname_regex.match(
+                        output, match.end()
+                    ).group()
+            else:
+                features.add(value)
+
+        address_keywords = DEFAULT_ADDRESS_KEYWORDS
+        for platform, _, platform_address_keywords in self.platform_signatures:
+            if platform in hostnames:
+                name = hostnames[platform]
+                missing_hostname = False
+                address_keywords = platform_address_keywords
+                break
         else:
-            self.match_name_unknown = re.search(
-                r"^.*[@<\s](?!command)(\w*)[#>].*", output, flags=re.MULTILINE
-            )
-            if self.match_name_unknown is not None:
-                self.name = str(self.match_name_unknown.group(1))
-                self.missing_hostname = False
+            match_name_unknown = self.unknown_hostname_regex.search(output)
+            if match_name_unknown is not None:
+                name = str(match_name_unknown.group(1))
+                missing_hostname = False
                 # Defaults to checkpoint for command parsing
-                self.platform = "checkpoint_gaia"
+                platform = "checkpoint_gaia"
+                address_keywords = self.platform_address_keywords[platform]
             else:
-                self.name = "No hostname was detected"
-                self.missing_hostname = True
-                self.platform = "No platform detected"
+                name = "No hostname was detected"
+                missing_hostname = True
+                platform = "No platform detected"
 
         # Parse Interface Addresses from Device Configuration
-        if self.platform == "checkpoint_gaia":
-            self.match_int_addresses = re.findall(
-                r"ipv4-address (25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?) mask-length (\d+)",
-                output,
-            )
-        elif self.platform == "juniper_junos":
-            self.match_int_addresses = re.findall(
-                r"inet address (25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\/(\d+)",
-                output,
-            )
-        else:
-            self.match_int_addresses = re.findall(
-                r"ip address (25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?) (255)\.(0|128|192|224|240|248|252|254|255)\.(0|128|192|224|240|248|252|254|255)\.(0|128|192|224|240|248|252|254|255)",
-                output,
-            )
+        int_addresses = []
+        for address_keyword in address_keywords:
+            extract = self.address_extractors[address_keyword]
+            for position in address_positions.get(address_keyword, []):
+                interface = extract(output, position)
+                if interface is not None:
+                    int_addresses.append(interface)
 
-        self.int_addresses = []
-        if self.match_int_addresses is not None:
-            self.missing_networks = False
-            if self.platform == "checkpoint_gaia" or self.platform == "juniper_junos":
-                for self.int_address in self.match_int_addresses:
-                    self.int_addresses.append(
-                        ipaddress.ip_interface(
-                            f"{self.int_address[0]}.{self.int_address[1]}.{self.int_address[2]}.{self.int_address[3]}/{self.int_address[4]}"
-                        )
-                    )
-            else:
-                for self.int_address in self.match_int_addresses:
-                    self.int_addresses.append(
-                        ipaddress.ip_interface(
-                            f"{self.int_address[0]}.{self.int_address[1]}.{self.int_address[2]}.{self.int_address[3]}/{self.int_address[4]}.{self.int_address[5]}.{self.int_address[6]}.{self.int_address[7]}"
-                        )
-                    )
-        if not self.int_addresses:
-            self.missing_networks = True
+        return ConfigScan(name, missing_hostname, platform, int_addresses, features)
 
-        # Determine if device is running a DHCP Server
-        if re.findall(r"dhcp pool|dhcp server ip-pool", output):
-            self.dhcp_server = True
-        else:
-            self.dhcp_server = False
-
-        # Determine if device has NAT configuration
-        if re.findall(
-            r"nat static|nat outbound|ip nat inside|ip nat outside|set nat-pool|set source pool|set destination pool|set static rule-set",
-            output,
-        ):
-            self.nat = True
-        else:
-            self.nat = False
 
-        # Parse commands via NTC Templates
-        if command_contents.get(self.name):
-            print(
-                f"Found the following commands to parse:\n{command_contents.get(self.name).keys()}"
-            )
-            for self.command, self.command_content in command_contents.get(
-                self.name
-            ).items():
-                self.lines = self.command_content.split("\n")
-                self.remove_lines = []
-                for self.index, self.row in enumerate(self.lines):
-                    if "proprietary" in self.row.lower():
-                        self.remove_lines.append(self.index)
-                for self.index in sorted(self.remove_lines, reverse=True):
-                    del self.lines[self.index]
-                self.data = "".join(self.lines)
-                try:
-                    template_parsed = parse_output(
-                        platform=self.platform, command=self.command, data=self.data
-                    )
-                    if "arp" in self.command:
-                        self.arp = template_parsed
-                    if "rout" in self.command:
-                        self.routes = template_parsed
-                    if "mac" in self.command:
-                        self.macs = template_parsed
-                    print(
-                        f'\n"[bold green]{self.command}" successfully parsed:[/]\n{template_parsed}'
-                    )
-                except Exception as e:
-                    print(
-                        f"[bold yellow]TextFSM could not parse[/] {self.command} from {self.ref_file} \n\n{e}"
-                    )
+config_scanner = ConfigScanner(
+    PLATFORM_SIGNATURES, ADDRESS_EXTRACTORS, FEATURE_SIGNATURES
+)
+
+
+class DeviceRecord(
+    namedtuple(
+        "DeviceRecord",
+        [
+            "ref_file",
+            "site",
+            "name",
+            "missing_hostname",
+            "platform",
+            "int_addresses",
+            "missing_networks",
+            "dhcp_server",
+            "nat",
+            "routes",
+            "arp",
+            "macs",
+        ],
+    )
+):
+    """Represents network device and associated attributes
+
+    Records are immutable and hold only what was extracted from the configuration and command output,
+    routes, ARP and MAC tables are ParsedTables of tuples. Parsing returns updated copies via _replace.
+    """
+
+    __slots__ = ()
 
     def __str__(self):
         return self.name
 
     @property
     def sorted_int_addresses(self):
-        return sorted(self.int_addresses)
+        # IPv4 before IPv6, then by network and address as ipaddress orders interfaces
+        return sorted(self.int_addresses, key=lambda interface: interface.sort_key)
 
-    @property
-    def route_networks(self):
-        self.route_ip_networks = []
-        if self.routes:
-            for self.network in self.routes:
-                try:
-                    self.route_ip_networks.append(
-                        ipaddress.IPv4Network(
-                            f"{self.network.get('network')}/{self.network.get('mask')}"
-                        )
-                    )
-                except Exception as e:
+
+def parse_device_config(orig_file, ref_file, site, output):
+    """Parses the device name, platform, interface addresses and features of a configuration in a single pass"""
+    config = config_scanner.scan(output)
+    return DeviceRecord(
+        ref_file=reference_name(orig_file, ref_file),
+        site=site,
+        name=config.name,
+        missing_hostname=config.missing_hostname,
+        platform=config.platform,
+        int_addresses=tuple(config.int_addresses),
+        missing_networks=not config.int_addresses,
+        dhcp_server="dhcp_server" in config.features,
+        nat="nat" in config.features,
+        routes=EMPTY_TABLE,
+        arp=EMPTY_TABLE,
+        macs=EMPTY_TABLE,
+    )
+
+
+def strip_lines(output, keyword):
+    """Removes the lines of output holding keyword in any case, without splitting output into lines"""
+    lowered = output.lower()
+    position = lowered.find(keyword)
+    if position == -1:
+        return output
+    if len(lowered) != len(output):
+        # A few characters lowercase to several, offsets would not line up
+        return "\n".join(
+            line for line in output.split("\n") if keyword not in line.lower()
+        )
+    kept = []
+    start = 0
+    while position != -1:
+        line_start = lowered.rfind("\n", 0, position) + 1
+        kept.append(output[start:line_start])
+        line_end = lowered.find("\n", position)
+        if line_end == -1:
+            start = len(output)
+            break
+        start = line_end + 1
+        position = lowered.find(keyword, start)
+    kept.append(output[start:])
+    return "".join(kept)
+
+
+# Records of each parsed command printed to the console
+PREVIEW_RECORDS = 20
+
+
+def parse_commands(device, commands):
+    """Parses sliced command output for a device via NTC Templates, returning the updated record"""
+    if console.rich_output:
+        print(f"Found the following commands to parse:\n{commands.keys()}")
+    tables = {}
+    for command, command_content in commands.items():
+        data = strip_lines(command_content, "proprietary")
+        try:
+            # Compiled outside the template span, which would otherwise count it twice
+            compile_template(device.platform, command)
+            with profiler.span(
+                command,
+                "template",
+                file=device.ref_file,
+                platform=device.platform,
+                bytes=len(data),
+            ):
+                template_parsed = parse_table(device.platform, command, data)
+            if "arp" in command:
+                tables["arp"] = template_parsed
+            if "rout" in command:
+                tables["routes"] = template_parsed
+            if "mac" in command:
+                tables["macs"] = template_parsed
+            # Rendering whole tables costs far more than parsing them, people get to see the first records
+            if console.rich_output:
+                print(
+                    f'\n"[bold green]{command}" successfully parsed:[/]\n'
+                    f"{list(islice(template_parsed.records(), PREVIEW_RECORDS))}"
+                )
+                if len(template_parsed.rows) > PREVIEW_RECORDS:
                     print(
-                        f"[bold yellow]Unable to add network from {self.ref_file} (likely incomplete data)\n\n{e}"
+                        f"... {len(template_parsed.rows) - PREVIEW_RECORDS} more of {len(template_parsed.rows)} records"
                     )
-        return sorted(self.route_ip_networks)
+            console.log(
+                "parsed",
+                file=device.ref_file,
+                command=command,
+                rows=len(template_parsed.rows),
+            )
+        except Exception as e:
+            error(
+                f"[bold yellow]TextFSM could not parse[/] {command} from {device.ref_file} \n\n{e}"
+            )
+    return device._replace(**tables)
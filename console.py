@@ -0,0 +1,80 @@
+import json
+import re
+import sys
+import time
+
+# rich: rendered for people, quiet: errors only, json: one JSON log record per line for automation
+CONSOLE_MODES = ("rich", "quiet", "json")
+
+# Console markup such as [bold red] or [/], left out of json records
+MARKUP = re.compile(r"\[/?[a-z][a-z ]*\]|\[/\]")
+
+
+class Console:
+    """Console output of the parser, rendered with rich, silenced, or written as structured log records
+
+    rich is only imported once something is rendered, so quiet and json runs never load it. Callers that
+    would build large output (parsed tables, report previews) check rich_output first and log a short
+    event instead.
+    """
+
+    def __init__(self, mode="rich", stream=None) -> None:
+        self.mode = mode
+        self.stream = stream
+
+    def set_mode(self, mode):
+        if mode not in CONSOLE_MODES:
+            raise ValueError(f"{mode} is not one of {', '.join(CONSOLE_MODES)}")
+        self.mode = mode
+
+    @property
+    def rich_output(self):
+        return self.mode == "rich"
+
+    def print(self, *objects, sep=" ", end="\n"):
+        if self.mode == "rich":
+            from rich import print as rich_print
+
+            rich_print(*objects, sep=sep, end=end, file=self.stream)
+        elif self.mode == "json":
+            message = MARKUP.sub("", sep.join(str(value) for value in objects)).strip()
+            if message:
+                self.log("message", message=message)
+
+    def error(self, *objects, sep=" ", end="\n"):
+        """Prints an error or warning to stderr, quiet mode only mutes progress output"""
+        if self.mode == "rich":
+            from rich import print as rich_print
+
+            rich_print(*objects, sep=sep, end=end, file=sys.stderr)
+            return
+        message = MARKUP.sub("", sep.join(str(value) for value in objects)).strip()
+        if not message:
+            return
+        if self.mode == "json":
+            self.log("error", message=message)
+        else:
+            sys.stderr.write(message + end)
+            sys.stderr.flush()
+
+    def log(self, event, **fields):
+        """Writes a structured log record in json mode, nothing otherwise"""
+        if self.mode != "json":
+            return
+        stream = self.stream or sys.stdout
+        record = {"time": round(time.time(), 3), "event": event, **fields}
+        stream.write(json.dumps(record, default=str) + "\n")
+        stream.flush()
+
+
+console = Console()
+
+
+def print(*objects, sep=" ", end="\n"):
+    """Drop-in replacement for rich.print honouring the console mode"""
+    console.print(*objects, sep=sep, end=end)
+
+
+def error(*objects, sep=" ", end="\n"):
+    """print for errors and warnings, written to stderr whatever the console mode"""
+    console.error(*objects, sep=sep, end=end)
@@ -6,3 +6,27 @@ COMMAND_LIST = [
     "show ip route",
     "show route",
 ]
+# Bump whenever parsing output changes so cached parse results are invalidated
+PARSER_VERSION = 5
+# IANA special-purpose IPv4 ranges classified as private, loopback and reserved, as ipaddress classifies
+# them since Python 3.12.4. Declared here so the classification does not depend on the interpreter.
+IPV4_PRIVATE_NETWORKS = (
+    "0.0.0.0/8",
+    "10.0.0.0/8",
+    "127.0.0.0/8",
+    "169.254.0.0/16",
+    "172.16.0.0/12",
+    "192.0.0.0/24",
+    "192.0.0.170/31",
+    "192.0.2.0/24",
+    "192.168.0.0/16",
+    "198.18.0.0/15",
+    "198.51.100.0/24",
+    "203.0.113.0/24",
+    "240.0.0.0/4",
+    "255.255.255.255/32",
+)
+# Globally reachable services within the private ranges
+IPV4_PRIVATE_EXCEPTIONS = ("192.0.0.9/32", "192.0.0.10/32")
+IPV4_LOOPBACK_NETWORKS = ("127.0.0.0/8",)
+IPV4_RESERVED_NETWORKS = ("240.0.0.0/4",)
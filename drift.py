@@ -0,0 +1,372 @@
+import argparse
+import hashlib
+import os
+import pickle
+import sqlite3
+import zlib
+from collections import Counter
+from datetime import datetime
+from glob import glob
+from itertools import groupby
+from operator import itemgetter
+from console import error, print
+from constants import PARSER_VERSION
+from fleet_index import ARP_ADDRESS_FIELDS, INTERFACE_FIELDS, MAC_FIELDS
+from fleet_index import first_column, normalize_mac
+from report_writer import ReportWriter
+from route_normalizer import ROUTE_FIELDS, route_normalizer
+
+# Dataset: (key columns, value columns), rows with the same key are matched between snapshots
+SNAPSHOT_DATASETS = {
+    "devices": (
+        ("device", "site"),
+        (
+            "platform",
+            "dhcp_server",
+            "nat",
+            "routing_table",
+            "arp_table",
+            "mac_table",
+            "file",
+        ),
+    ),
+    "interfaces": (("device", "site", "address"), ("prefixlen",)),
+    "routes": (("device", "site", "network", "mask"), ("protocol", "nexthop_ip")),
+    "arp": (("device", "site", "address"), ("mac", "interface")),
+    "macs": (("device", "site", "mac", "vlan"), ("interface",)),
+}
+
+DRIFT_COLUMNS = [
+    "dataset",
+    "change",
+    "device",
+    "site",
+    "item",
+    "field",
+    "previous",
+    "current",
+]
+
+
+def key_value(value):
+    # Keys are sorted, None would not compare with strings. Device names and sites are never None
+    return "" if value is None else str(value)
+
+
+def device_rows(device):
+    # Booleans are kept as they read in device_details.csv, SQLite would return them as integers
+    yield (device.name, device.site), (
+        device.platform,
+        str(bool(device.dhcp_server)),
+        str(bool(device.nat)),
+        str(bool(device.routes)),
+        str(bool(device.arp)),
+        str(bool(device.macs)),
+        device.ref_file,
+    )
+
+
+def interface_rows(device):
+    for interface in device.int_addresses:
+        yield (device.name, device.site, str(interface.interface.ip)), (
+            interface.prefixlen,
+        )
+
+
+def route_rows(device):
+    columns = route_normalizer.columns(device.routes, device.platform)
+    for protocol, network, mask, nexthop_ip in zip(
+        *(columns[field] for field in ROUTE_FIELDS)
+    ):
+        yield (device.name, device.site, key_value(network), key_value(mask)), (
+            protocol,
+            nexthop_ip,
+        )
+
+
+def arp_rows(device):
+    for address, mac, interface in zip(
+        first_column(device.arp, ARP_ADDRESS_FIELDS),
+        first_column(device.arp, MAC_FIELDS),
+        first_column(device.arp, INTERFACE_FIELDS),
+    ):
+        yield (device.name, device.site, key_value(address)), (
+            normalize_mac(mac) or mac,
+            interface,
+        )
+
+
+def mac_rows(device):
+    for mac, vlan, interface in zip(
+        first_column(device.macs, MAC_FIELDS),
+        device.macs.column("vlan"),
+        first_column(device.macs, INTERFACE_FIELDS),
+    ):
+        yield (
+            device.name,
+            device.site,
+            key_value(normalize_mac(mac) or mac),
+            key_value(vlan),
+        ), (interface,)
+
+
+DATASET_ROWS = {
+    "devices": device_rows,
+    "interfaces": interface_rows,
+    "routes": route_rows,
+    "arp": arp_rows,
+    "macs": mac_rows,
+}
+
+
+def snapshot_file_name(directory):
+    return os.path.join(directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}.sqlite")
+
+
+def latest_snapshot(directory):
+    """Returns the most recent snapshot of a directory, None when it holds none"""
+    snapshots = sorted(glob(os.path.join(directory, "*.sqlite")))
+    return snapshots[-1] if snapshots else None
+
+
+class Snapshot:
+    """Extracted datasets of one run in a SQLite file, sorted and keyed for merge-joins
+
+    Every dataset table holds one row per (device, site) in key order: the device's rows of the dataset,
+    sorted by key and stored as a compressed pickle, along with their digest. Two snapshots are compared
+    by merging their tables in a single pass, the rows of a device are only unpacked when its digest
+    changed.
+    """
+
+    def __init__(self, path) -> None:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No snapshot found at {path}")
+        self.path = path
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.created, self.parser_version, self.devices = self.db.execute(
+            "SELECT created, parser_version, devices FROM snapshot"
+        ).fetchone()
+
+    @classmethod
+    def write(cls, devices, directory="snapshots"):
+        """Saves the datasets of a run as a new snapshot of directory"""
+        os.makedirs(directory, exist_ok=True)
+        path = snapshot_file_name(directory)
+        building = f"{path}.building"
+        db = sqlite3.connect(building)
+        try:
+            db.execute("PRAGMA journal_mode = OFF")
+            db.execute("PRAGMA synchronous = OFF")
+            db.execute(
+                "CREATE TABLE snapshot (created TEXT, parser_version INTEGER, devices INTEGER)"
+            )
+            db.execute(
+                "INSERT INTO snapshot VALUES (?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    PARSER_VERSION,
+                    len(devices),
+                ),
+            )
+            for dataset in SNAPSHOT_DATASETS:
+                # Devices sharing a name and site are kept together
+                device_rows = {}
+                for device in devices:
+                    device_rows.setdefault(
+                        (key_value(device.name), key_value(device.site)), []
+                    ).extend(
+                        (key, values) for key, values in DATASET_ROWS[dataset](device)
+                    )
+                db.execute(
+                    f"CREATE TABLE {dataset} (device TEXT, site TEXT, digest BLOB, rows BLOB)"
+                )
+                db.executemany(
+                    f"INSERT INTO {dataset} VALUES (?, ?, ?, ?)",
+                    (
+                        (*key, *pack_rows(device_rows[key]))
+                        for key in sorted(device_rows)
+                    ),
+                )
+            db.commit()
+        finally:
+            db.close()
+        os.replace(building, path)
+        return cls(path)
+
+    def close(self):
+        self.db.close()
+
+    def devices_rows(self, dataset):
+        """Yields ((device, site), (digest, packed rows)) of a dataset in key order"""
+        for device, site, digest, rows in self.db.execute(
+            f"SELECT device, site, digest, rows FROM {dataset} ORDER BY rowid"
+        ):
+            yield (device, site), (digest, rows)
+
+    def rows(self, dataset):
+        """Yields (key, values) of a dataset in key order"""
+        for _, (_, rows) in self.devices_rows(dataset):
+            yield from unpack_rows(rows)
+
+
+def pack_rows(rows):
+    """Sorts (key, values) rows by key, returns (digest, compressed pickle) of them"""
+    rows.sort(key=itemgetter(0))
+    packed = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+    return hashlib.sha256(packed).digest(), zlib.compress(packed, 1)
+
+
+def unpack_rows(rows):
+    return pickle.loads(zlib.decompress(rows))
+
+
+def merge_join(previous, current):
+    """Yields (key, previous values, current values) for every key of two streams of (key, values) sorted
+    by key, a key missing from one side has no values there
+    """
+    previous = groupby(previous, key=itemgetter(0))
+    current = groupby(current, key=itemgetter(0))
+    previous_key, previous_group = next(previous, (None, None))
+    current_key, current_group = next(current, (None, None))
+    while previous_group is not None or current_group is not None:
+        if current_group is None or (
+            previous_group is not None and previous_key < current_key
+        ):
+            yield previous_key, [values for _, values in previous_group], []
+            previous_key, previous_group = next(previous, (None, None))
+        elif previous_group is None or current_key < previous_key:
+            yield current_key, [], [values for _, values in current_group]
+            current_key, current_group = next(current, (None, None))
+        else:
+            yield (
+                current_key,
+                [values for _, values in previous_group],
+                [values for _, values in current_group],
+            )
+            previous_key, previous_group = next(previous, (None, None))
+            current_key, current_group = next(current, (None, None))
+
+
+def describe(columns, values):
+    return "; ".join(f"{column}={value}" for column, value in zip(columns, values))
+
+
+def changed_rows(previous, current, dataset):
+    """Yields (key, previous values, current values) of the rows of a dataset held by devices whose rows
+    differ between two snapshots, devices with the same digest on both sides are skipped unread
+    """
+    for _, previous_device, current_device in merge_join(
+        previous.devices_rows(dataset), current.devices_rows(dataset)
+    ):
+        previous_digest, previous_rows = (
+            previous_device[0] if previous_device else (None, None)
+        )
+        current_digest, current_rows = (
+            current_device[0] if current_device else (None, None)
+        )
+        if previous_digest == current_digest:
+            continue
+        yield from merge_join(
+            unpack_rows(previous_rows) if previous_rows is not None else [],
+            unpack_rows(current_rows) if current_rows is not None else [],
+        )
+
+
+def diff_snapshots(previous, current):
+    """Yields DRIFT_COLUMNS rows of what was added, removed or changed from one snapshot to the next
+
+    Rows sharing a key are compared as multisets, so equal-cost routes and the like only show up when
+    they change. A key holding one row on each side that differ is reported as changed, field by field.
+    """
+    for dataset, (key_columns, value_columns) in SNAPSHOT_DATASETS.items():
+        for key, previous_values, current_values in changed_rows(
+            previous, current, dataset
+        ):
+            if previous_values == current_values:
+                continue
+            if previous_values and current_values:
+                removed = Counter(previous_values)
+                removed.subtract(current_values)
+                added = Counter(current_values)
+                added.subtract(previous_values)
+                removed = list(removed.elements())
+                added = list(added.elements())
+            else:
+                removed, added = previous_values, current_values
+            device, site = key[:2]
+            item = " ".join(key[2:])
+            if len(removed) == 1 and len(added) == 1:
+                for column, old, new in zip(value_columns, removed[0], added[0]):
+                    if old != new:
+                        yield dataset, "changed", device, site, item, column, old, new
+                continue
+            for values in removed:
+                yield dataset, "removed", device, site, item, "", describe(
+                    value_columns, values
+                ), ""
+            for values in added:
+                yield dataset, "added", device, site, item, "", "", describe(
+                    value_columns, values
+                )
+
+
+def write_drift(previous, current, drift_report):
+    """Writes the drift between two snapshots to a ReportWriter, then closes the snapshots"""
+    if previous.parser_version != current.parser_version:
+        error(
+            f"[bold yellow]Snapshots were taken by different parser versions ({previous.parser_version} and "
+            f"{current.parser_version}), some changes may come from the parser"
+        )
+    print(
+        f"\n[bold green]Changes from {previous.path} ({previous.created}) to {current.path} ({current.created})\n"
+    )
+    drift_report.write_rows(diff_snapshots(previous, current))
+    previous.close()
+    current.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reports what changed between two snapshots saved by run_parser.py --snapshot"
+    )
+    parser.add_argument(
+        "previous",
+        nargs="?",
+        help="earlier snapshot (default: the second most recent in --snapshot-dir)",
+    )
+    parser.add_argument(
+        "current",
+        nargs="?",
+        help="later snapshot (default: the most recent in --snapshot-dir)",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default="snapshots",
+        help="directory holding the snapshots (default: snapshots)",
+    )
+    parser.add_argument(
+        "--output",
+        default="drift_report.csv",
+        help="CSV drift report (default: drift_report.csv)",
+    )
+    args = parser.parse_args()
+
+    paths = [args.previous, args.current]
+    if None in paths:
+        snapshots = sorted(glob(os.path.join(args.snapshot_dir, "*.sqlite")))
+        if len(snapshots) < 2:
+            error(f"[bold red]Two snapshots are needed in {args.snapshot_dir}")
+            raise SystemExit(1)
+        paths = snapshots[-2:]
+    try:
+        previous, current = Snapshot(paths[0]), Snapshot(paths[1])
+    except Exception as e:
+        error("Ouch!", e.__class__, "occurred.", e)
+        raise SystemExit(1)
+    drift_report = ReportWriter(args.output, "Changes", fieldnames=DRIFT_COLUMNS)
+    write_drift(previous, current, drift_report)
+    drift_report.close()
+
+
+if __name__ == "__main__":
+    main()
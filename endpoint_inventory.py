@@ -0,0 +1,180 @@
+import ipaddress
+import re
+from functools import lru_cache
+from address_extractor import ipv4_int
+from fleet_index import ARP_ADDRESS_FIELDS, INTERFACE_FIELDS, MAC_FIELDS
+from fleet_index import first_column, first_field, normalize_mac
+
+ENDPOINT_COLUMNS = [
+    "ipaddress",
+    "macaddress",
+    "device",
+    "interface",
+    "vlan",
+    "site",
+    "source",
+    "ambiguous",
+    "port_macs",
+    "arp_device",
+]
+
+# Link aggregations carry the MAC addresses of whole switches, they are only used when nothing else is
+AGGREGATE_INTERFACES = re.compile(
+    r"(?:bridge-aggregation|route-aggregation|port-channel|po\d|ae\d|bagg|ragg)",
+    re.IGNORECASE,
+)
+
+
+def address_sort_key(address):
+    """Integer sort key of an address: IPv4 then IPv6 in address order, anything else last"""
+    value = ipv4_int(address)
+    if value is not None:
+        return 4, value
+    try:
+        address = ipaddress.ip_address(str(address).strip())
+    except ValueError:
+        return 7, 0
+    return address.version, int(address)
+
+
+def format_mac(mac):
+    """Writes the 12 hex digits of a normalized MAC address as aa:bb:cc:dd:ee:ff"""
+    return f"{mac[0:2]}:{mac[2:4]}:{mac[4:6]}:{mac[6:8]}:{mac[8:10]}:{mac[10:12]}"
+
+
+@lru_cache(maxsize=4096)
+def vlan_key(vlan):
+    """VLAN of a MAC or ARP entry as compared between the two, None when it has none"""
+    if vlan is None:
+        return None
+    vlan = str(vlan).strip()
+    return vlan or None
+
+
+class MacLocations:
+    """Port every normalized MAC address of the MAC tables was learned on, per site and VLAN
+
+    A MAC address is learned on the access port of its endpoint and on every uplink towards it, so the port
+    holding it that learned the fewest MAC addresses is taken, link aggregations last. Ports are ranked
+    once and assigned from the worst to the best, the best port of each MAC address is assigned last.
+    Virtual gateway MAC addresses (VRRP, HSRP) and MAC addresses reused in separate L2 domains are
+    learned at several sites or in several VLANs. Only those are also kept by (site, MAC address, VLAN)
+    and (site, MAC address), so the fleet wide map is the only one most MAC addresses need. Locations are
+    (device, interface, vlan, MAC addresses learned on the port).
+    """
+
+    def __init__(self, devices) -> None:
+        ports = {}  # (device index, interface): [(mac, vlan)]
+        for device_index, device in enumerate(devices):
+            if not device.macs:
+                continue
+            for mac, vlan, interface in zip(
+                first_column(device.macs, MAC_FIELDS),
+                device.macs.column("vlan"),
+                first_column(device.macs, INTERFACE_FIELDS),
+            ):
+                mac = normalize_mac(mac)
+                if mac is not None and interface:
+                    ports.setdefault((device_index, interface), []).append((mac, vlan))
+
+        def rank(port):
+            return AGGREGATE_INTERFACES.match(port[1]) is not None, len(ports[port])
+
+        # Sorting is stable, among ports of the same rank the first found is assigned last
+        ranked = list(reversed(sorted(ports, key=rank)))
+        self.by_mac = by_mac = {}
+        self.shared = shared = set()
+        for port in ranked:
+            device = devices[port[0]]
+            interface = port[1]
+            site = device.site
+            learned = len(ports[port])
+            for mac, vlan in ports[port]:
+                previous = by_mac.get(mac)
+                if previous is not None and (
+                    previous[0].site != site or previous[2] != vlan
+                ):
+                    shared.add(mac)
+                by_mac[mac] = (device, interface, vlan, learned)
+
+        self.by_vlan = {}
+        self.by_site = {}
+        if not shared:
+            return
+        for port in ranked:
+            device = devices[port[0]]
+            interface = port[1]
+            learned = len(ports[port])
+            for mac, vlan in ports[port]:
+                if mac in shared:
+                    location = (device, interface, vlan, learned)
+                    self.by_vlan[device.site, mac, vlan_key(vlan)] = location
+                    self.by_site[device.site, mac] = location
+
+    def locate(self, site, mac, vlan=None):
+        """Returns (location, ambiguous) of a MAC address seen at site, None when no MAC table holds it
+
+        Ports of the same VLAN at the site come first, then any port at the site. A port at another site
+        is only taken when the site has none, and is flagged ambiguous.
+        """
+        if mac in self.shared:
+            vlan = vlan_key(vlan)
+            if vlan is not None:
+                location = self.by_vlan.get((site, mac, vlan))
+                if location is not None:
+                    return location, False
+            location = self.by_site.get((site, mac))
+            if location is not None:
+                return location, False
+        location = self.by_mac.get(mac)
+        if location is not None:
+            return location, location[0].site != site
+        return None
+
+
+def endpoint_rows(arp_details, locations):
+    """Yields ENDPOINT_COLUMNS rows of the ARP entries of the fleet, in their order, joined to the MAC
+    table port each MAC address was learned on
+
+    Entries whose MAC address is in no MAC table are kept with the interface of their ARP entry. An address
+    resolved to the same MAC address by several devices of a site is listed once.
+    """
+    seen = set()
+    for arp_dict in arp_details:
+        address = first_field(arp_dict, ARP_ADDRESS_FIELDS)
+        mac = normalize_mac(first_field(arp_dict, MAC_FIELDS))
+        if address is None or mac is None:
+            continue
+        site = arp_dict["site"]
+        key = (address, mac, site)
+        if key in seen:
+            continue
+        seen.add(key)
+        found = locations.locate(site, mac, arp_dict.get("vlan"))
+        if found is not None:
+            (device, interface, vlan, learned), ambiguous = found
+            yield (
+                address,
+                format_mac(mac),
+                device.name,
+                interface,
+                vlan,
+                device.site,
+                "mac_table",
+                ambiguous,
+                learned,
+                arp_dict["device"],
+            )
+        else:
+            yield (
+                address,
+                format_mac(mac),
+                arp_dict["device"],
+                first_field(arp_dict, INTERFACE_FIELDS),
+                arp_dict.get("vlan"),
+                site,
+                "arp_table",
+                False,
+                None,
+                arp_dict["device"],
+            )
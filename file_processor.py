@@ -0,0 +1,347 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from console import console, error, print
+from config_parser import FileHandler
+from config_parser import parse_commands, parse_device_config, slice_commands
+from config_parser import reference_name
+from constants import COMMAND_LIST
+from profiler import ProfiledTask, profiler
+from state_store import commands_digest
+
+
+def parse_site_name(orig_file):
+    """Parses the site name from a file name, None when it has none"""
+    match_site_name = re.search(r".*\/(.*) -", orig_file)
+    if match_site_name is not None:
+        return match_site_name.group(1)
+    return None
+
+
+@lru_cache(maxsize=4)
+def get_file_handler(orig_file):
+    # Each worker keeps recently used archives open instead of re-reading the central directory per member
+    return FileHandler(orig_file)
+
+
+def read_member(orig_file, ref_file):
+    with profiler.span(
+        "read", "read", file=reference_name(orig_file, ref_file)
+    ) as span:
+        content = get_file_handler(orig_file).read_member(ref_file)
+        span["bytes"] = len(content)
+    return content
+
+
+def slice_member(task):
+    """Worker: slices commands and parses the device configuration of a single file or zip member"""
+    file_index, member_index, orig_file, ref_file, site_name, command_list, cache = task
+    try:
+        content = read_member(orig_file, ref_file)
+    except Exception as e:
+        error("Ouch!", e.__class__, "occurred.")
+        return file_index, member_index, None, {}, None
+    file_name = reference_name(orig_file, ref_file)
+    if cache is not None:
+        with profiler.span("get", "cache", file=file_name):
+            cache_key = cache.key("member", "\n".join(command_list), content)
+            cached = cache.get(cache_key)
+        if cached is not None:
+            command_hostname, commands_found, device = cached
+            # The same capture may have been cached under another file or site name
+            device = device._replace(ref_file=file_name, site=site_name)
+            return file_index, member_index, command_hostname, commands_found, device
+    with profiler.span("slice", "slice", file=file_name, bytes=len(content)):
+        command_hostname, commands_found = slice_commands(content, command_list)
+    with profiler.span("config", "config", file=file_name, bytes=len(content)):
+        device = parse_device_config(orig_file, ref_file, site_name, content)
+    if cache is not None:
+        with profiler.span("set", "cache", file=file_name):
+            cache.set(cache_key, (command_hostname, commands_found, device))
+    return file_index, member_index, command_hostname, commands_found, device
+
+
+def parse_device_commands(task):
+    """Worker: parses the sliced commands found for a device via NTC Templates"""
+    device, commands, cache = task
+    if cache is not None:
+        with profiler.span("get", "cache", file=device.ref_file):
+            cache_key = cache.key(
+                "commands",
+                device.platform,
+                *[part for item in commands.items() for part in item],
+            )
+            cached = cache.get(cache_key)
+        if cached is not None:
+            routes, arp, macs = cached
+            return device._replace(routes=routes, arp=arp, macs=macs)
+    device = parse_commands(device, commands)
+    if cache is not None:
+        with profiler.span("set", "cache", file=device.ref_file):
+            cache.set(cache_key, (device.routes, device.arp, device.macs))
+    return device
+
+
+def parse_capture(content, file_name="capture.txt", command_list=COMMAND_LIST):
+    """Parses a single capture held in memory, returning its DeviceRecord
+
+    For automation parsing one device at a time: nothing is read from the input folder, cached or
+    reported, the site is derived from file_name as for files in the input folder, and TextFSM is only
+    loaded when the capture holds commands to parse.
+    """
+    orig_file = f"input/{file_name}"
+    site_name = parse_site_name(orig_file) or ""
+    command_hostname, commands_found = slice_commands(content, command_list)
+    device = parse_device_config("input/", orig_file, site_name, content)
+    if commands_found and command_hostname == device.name:
+        device = parse_commands(device, commands_found)
+    return device
+
+
+class TaskPool:
+    """Maps worker functions over tasks in task order, in a process pool when more than one job is asked for"""
+
+    def __init__(self, jobs=1) -> None:
+        self.workers = max(1, jobs or os.cpu_count() or 1)
+        # Workers print in the console mode of the run, whatever the process start method
+        self.executor = (
+            ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=console.set_mode,
+                initargs=(console.mode,),
+            )
+            if self.workers > 1
+            else None
+        )
+        self.thread = None
+
+    def map(self, function, tasks):
+        phase = profiler.span(function.__name__, "run", tasks=len(tasks))
+        if profiler.enabled:
+            # Workers hand back the events they recorded along with each result
+            function = ProfiledTask(function)
+        with phase:
+            if self.executor is None:
+                results = list(map(function, tasks))
+            else:
+                chunksize = max(1, len(tasks) // (self.workers * 4))
+                results = list(self.executor.map(function, tasks, chunksize=chunksize))
+        if profiler.enabled:
+            results, events = zip(*results) if results else ([], [])
+            for task_events in events:
+                profiler.events.extend(task_events)
+            results = list(results)
+        return results
+
+    async def run(self, function, task):
+        """Runs function on one task without blocking the event loop, in a thread when there is no process pool"""
+        import asyncio
+
+        if self.executor is None and self.thread is None:
+            self.thread = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_running_loop()
+        if not profiler.enabled:
+            return await loop.run_in_executor(
+                self.executor or self.thread, function, task
+            )
+        result, events = await loop.run_in_executor(
+            self.executor or self.thread, ProfiledTask(function), task
+        )
+        profiler.events.extend(events)
+        return result
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.thread is not None:
+            self.thread.shutdown()
+
+
+def slice_files(files_found, command_list, pool, cache=None, state=None):
+    """Slices commands and parses device configurations of every file and zip member
+
+    Returns (sites, files_missing_site_name, members), members being (file_index, member_index,
+    command_hostname, commands_found, device) in file then member order, devices without their commands.
+    """
+    sites = []
+    files_missing_site_name = []
+    tasks = []
+    # (file_index, member_index, command_hostname, commands_found, device) of unchanged files
+    stored_members = []
+    fingerprints = {}  # file_index: fingerprint of new or changed files
+    unchanged_files = 0
+    with profiler.span("list files", "run", files=len(files_found)):
+        for file_index, orig_file in enumerate(files_found):
+            site_name = parse_site_name(orig_file)
+            if site_name is not None:
+                sites.append(site_name)
+            else:
+                site_name = ""
+                files_missing_site_name.append(orig_file[6:])
+            if state is not None:
+                try:
+                    fingerprint = state.fingerprint(orig_file)
+                    members = state.stored_members(orig_file, fingerprint)
+                except OSError as e:
+                    error("Ouch!", e.__class__, "occurred.")
+                    continue
+                if members is not None:
+                    stored_members.extend((file_index, *member) for member in members)
+                    unchanged_files += 1
+                    continue
+                fingerprints[file_index] = fingerprint
+            print(f"\nLoading {orig_file}...\n")
+            try:
+                # Not cached, forked workers must not share the parent's archive file handles
+                file_handler = FileHandler(orig_file)
+                member_names = file_handler.member_names()
+                file_handler.close()
+            except Exception as e:
+                error("Ouch!", e.__class__, "occurred.")
+                if state is not None:
+                    fingerprints.pop(file_index, None)
+                    state.retire_file(orig_file)
+                continue
+            for member_index, ref_file in enumerate(member_names):
+                tasks.append(
+                    (
+                        file_index,
+                        member_index,
+                        orig_file,
+                        ref_file,
+                        site_name,
+                        command_list,
+                        cache,
+                    )
+                )
+
+    # Results come back in task order, so members of a file stay grouped together
+    members = pool.map(slice_member, tasks)
+    if state is not None:
+        file_members = {file_index: [] for file_index in fingerprints}
+        for file_index, *member in members:
+            file_members[file_index].append(member)
+        for file_index, fingerprint in fingerprints.items():
+            orig_file = files_found[file_index]
+            if any(device is None for *_, device in file_members[file_index]):
+                # Unreadable members are retried on the next run
+                state.retire_file(orig_file)
+            else:
+                state.record_file(orig_file, fingerprint, file_members[file_index])
+        retired = state.retire(files_found)
+        print(
+            f"\n[bold green]{len(fingerprints)} new or changed files parsed, "
+            f"{unchanged_files} unchanged files loaded and {retired} deleted files retired from {state.path}\n"
+        )
+        members = sorted(stored_members + members, key=itemgetter(0, 1))
+    return sites, files_missing_site_name, members
+
+
+def match_commands(members, pool, cache=None, stored_commands=None):
+    """Hands every device the commands sliced from its file or the files before it, then parses them
+
+    members are slice_files members in file order. stored_commands(file_index, member_index, digest) may
+    return the (routes, arp, macs) of an earlier parse of the same commands, which is reused.
+    Returns (devices, command_contents, parses), parses mapping the (file_index, member_index) of every
+    device given commands to (commands digest, (routes, arp, macs)).
+    """
+    # Dict device_name: Dict of command: sliced_command_output
+    command_contents = {}
+    devices = []
+    parse_tasks = []
+    parses = {}
+    parse_keys = {}  # device index: (file_index, member_index, commands digest)
+    for _, file_members in groupby(members, key=itemgetter(0)):
+        file_members = list(file_members)
+        # Searches every file for commands that we intend to parse
+        for _, _, command_hostname, commands_found, _ in file_members:
+            if commands_found:
+                command_contents[command_hostname] = commands_found
+        # Devices only see commands sliced from this file or the files before it
+        for file_index, member_index, *_, device in file_members:
+            if device is None:
+                continue
+            commands = command_contents.get(device.name)
+            if commands:
+                digest = commands_digest(device.platform, commands)
+                stored = None
+                if stored_commands is not None:
+                    stored = stored_commands(file_index, member_index, digest)
+                if stored is not None:
+                    # Devices whose command output is unchanged reuse the stored parse
+                    routes, arp, macs = stored
+                    device = device._replace(routes=routes, arp=arp, macs=macs)
+                    parses[file_index, member_index] = (digest, stored)
+                else:
+                    parse_keys[len(devices)] = (file_index, member_index, digest)
+                    parse_tasks.append((len(devices), commands))
+            devices.append(device)
+    parsed_devices = pool.map(
+        parse_device_commands,
+        [(devices[index], commands, cache) for index, commands in parse_tasks],
+    )
+    for (index, _), device in zip(parse_tasks, parsed_devices):
+        devices[index] = device
+        file_index, member_index, digest = parse_keys[index]
+        parses[file_index, member_index] = (
+            digest,
+            (device.routes, device.arp, device.macs),
+        )
+    return devices, command_contents, parses
+
+
+def process_members(files_found, command_list, jobs=1, cache=None, state=None):
+    """Slices and parses every file as process_files does, also returning what a shard run keeps
+
+    Returns (sites, files_missing_site_name, members, devices, command_contents, parses), members and
+    parses as returned by slice_files and match_commands.
+    """
+    # (file_index, member_index) of devices whose parse was read from the state store
+    stored = set()
+
+    def lookup_stored(file_index, member_index, digest):
+        parsed = state.stored_commands(files_found[file_index], member_index, digest)
+        if parsed is not None:
+            stored.add((file_index, member_index))
+        return parsed
+
+    pool = TaskPool(jobs)
+    try:
+        sites, files_missing_site_name, members = slice_files(
+            files_found, command_list, pool, cache, state
+        )
+        devices, command_contents, parses = match_commands(
+            members, pool, cache, lookup_stored if state is not None else None
+        )
+    finally:
+        pool.close()
+    if state is not None:
+        for (file_index, member_index), (digest, parsed) in parses.items():
+            if (file_index, member_index) not in stored:
+                state.record_commands(
+                    files_found[file_index], member_index, digest, parsed
+                )
+
+    if cache is not None:
+        cache.evict()
+    if state is not None:
+        state.commit()
+
+    return sites, files_missing_site_name, members, devices, command_contents, parses
+
+
+def process_files(files_found, command_list, jobs=1, cache=None, state=None):
+    """Slices and parses every file, optionally fanning files and zip members out to a process pool
+
+    Results are merged in file order so command output is matched to devices exactly as a serial run would.
+    When a ParseCache is given, unchanged files and command output are loaded from it instead of parsed.
+    When a StateStore is given, files unchanged since the previous run are not opened at all, their
+    records are read from the store, and files no longer found are retired from it.
+    """
+    sites, files_missing_site_name, _, devices, command_contents, _ = process_members(
+        files_found, command_list, jobs, cache, state
+    )
+    return sites, devices, command_contents, files_missing_site_name
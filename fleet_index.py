@@ -0,0 +1,337 @@
+import argparse
+import ipaddress
+import os
+import socket
+import sqlite3
+import time
+from console import error, print
+from tabulate import tabulate
+from address_extractor import InterfaceAddress, packed_ipv4
+from route_normalizer import route_normalizer
+
+# Field names of the address, MAC address and interface columns across the ARP and MAC table templates
+ARP_ADDRESS_FIELDS = ("ipaddress", "address")
+MAC_FIELDS = ("macaddress", "mac", "destination_address", "mac_address")
+INTERFACE_FIELDS = ("interface", "destination_port", "logical_interface")
+
+HEX_DIGITS = "0123456789abcdef"
+
+SCHEMA = """
+    CREATE TABLE devices (name TEXT, name_key TEXT, platform TEXT, site TEXT, file TEXT);
+    CREATE TABLE networks (
+        version INTEGER, prefixlen INTEGER, network BLOB,
+        address TEXT, source TEXT, device TEXT, site TEXT, file TEXT
+    );
+    CREATE TABLE prefix_lengths (version INTEGER, prefixlen INTEGER);
+    CREATE TABLE arp (
+        address_key BLOB, address TEXT, mac_key TEXT, mac TEXT,
+        interface TEXT, device TEXT, site TEXT, file TEXT
+    );
+    CREATE TABLE macs (
+        mac_key TEXT, mac TEXT, vlan TEXT, interface TEXT, device TEXT, site TEXT, file TEXT
+    );
+"""
+
+# Indexes are created once the tables are filled, which is much faster than maintaining them row by row
+INDEXES = """
+    CREATE INDEX devices_name ON devices (name_key);
+    CREATE INDEX networks_prefix ON networks (version, prefixlen, network);
+    CREATE INDEX arp_address ON arp (address_key);
+    CREATE INDEX arp_mac ON arp (mac_key);
+    CREATE INDEX macs_mac ON macs (mac_key);
+"""
+
+
+def normalize_mac(mac):
+    """Returns a MAC address as 12 lowercase hex digits whatever its notation, None when it is not one
+
+    Covers aabb.ccdd.eeff (Cisco), aabb-ccdd-eeff (Comware), aa:bb:cc:dd:ee:ff and aa-bb-cc-dd-ee-ff.
+    """
+    if mac is None:
+        return None
+    digits = str(mac).replace("-", "").replace(".", "").replace(":", "").lower()
+    if len(digits) != 12:
+        # Separated by whitespace
+        digits = "".join(digits.split())
+    if len(digits) != 12 or digits.strip(HEX_DIGITS):
+        return None
+    return digits
+
+
+def address_key(address):
+    """Packed address used as lookup key, raises ValueError when it is not an address"""
+    packed = packed_ipv4(address)
+    if packed is not None:
+        return packed
+    return ipaddress.ip_address(str(address).strip()).packed
+
+
+def first_field(record, fields):
+    for field in fields:
+        if record.get(field):
+            return record[field]
+    return None
+
+
+def first_column(table, fields):
+    """Values of the first of fields found in a table, Nones when it has none of them"""
+    return table.column(
+        next((field for field in fields if field in table.header), None)
+    )
+
+
+def network_rows(device):
+    """Yields the interface subnets, interface addresses and routed networks of a device"""
+    for interface in device.int_addresses:
+        max_prefixlen = interface.max_prefixlen
+        network = interface.network_address
+        networks = [(interface.prefixlen, network, "interface")]
+        if interface.prefixlen < max_prefixlen:
+            networks.append((max_prefixlen, interface.address, "interface_ip"))
+        for prefixlen, address, source in networks:
+            if source == "interface_ip":
+                name = str(interface)
+            else:
+                name = str(InterfaceAddress(interface.version, network, prefixlen))
+            yield (
+                interface.version,
+                prefixlen,
+                address.to_bytes(max_prefixlen // 8, "big"),
+                name,
+                source,
+                device.name,
+                device.site,
+                device.ref_file,
+            )
+    # Malformed routes are reported while the network reports are written
+    addresses, prefixlens = route_normalizer.normalize(
+        device.routes, device.platform
+    ).sorted_networks()
+    for address, prefixlen in zip(addresses.tolist(), prefixlens.tolist()):
+        packed = address.to_bytes(4, "big")
+        yield (
+            4,
+            prefixlen,
+            packed,
+            f"{socket.inet_ntop(socket.AF_INET, packed)}/{prefixlen}",
+            "routing_table",
+            device.name,
+            device.site,
+            device.ref_file,
+        )
+
+
+def arp_rows(device):
+    for record in device.arp.records():
+        address = first_field(record, ARP_ADDRESS_FIELDS)
+        try:
+            key = address_key(address)
+        except ValueError:
+            continue
+        mac = first_field(record, MAC_FIELDS)
+        yield (
+            key,
+            address,
+            normalize_mac(mac),
+            mac,
+            first_field(record, INTERFACE_FIELDS),
+            device.name,
+            device.site,
+            device.ref_file,
+        )
+
+
+def mac_rows(device):
+    for record in device.macs.records():
+        mac = first_field(record, MAC_FIELDS)
+        mac_key = normalize_mac(mac)
+        if mac_key is None:
+            continue
+        yield (
+            mac_key,
+            mac,
+            record.get("vlan"),
+            first_field(record, INTERFACE_FIELDS),
+            device.name,
+            device.site,
+            device.ref_file,
+        )
+
+
+class FleetIndex:
+    """Persistent SQLite index answering which devices and sites hold an address, MAC address or hostname
+
+    Interface subnets, interface addresses and routed networks are keyed by (version, prefix length, packed
+    network address). A longest-prefix match probes that key once per prefix length present in the fleet,
+    longest first, so a lookup is a few dozen index probes at most whatever the size of the fleet. ARP
+    entries, MAC table entries and hostnames are looked up by their normalized key.
+    """
+
+    def __init__(self, path="fleet_index.sqlite") -> None:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No fleet index found at {path}")
+        self.path = path
+        # Read-only, an index rebuilt by another run replaces the file rather than changing it
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.db.row_factory = sqlite3.Row
+        self.prefix_lengths = {4: [], 6: []}
+        for version, prefixlen in self.db.execute(
+            "SELECT version, prefixlen FROM prefix_lengths ORDER BY prefixlen DESC"
+        ):
+            self.prefix_lengths[version].append(prefixlen)
+
+    @classmethod
+    def build(cls, devices, path="fleet_index.sqlite"):
+        """Indexes the devices of a run into a new database that atomically replaces the previous one"""
+        building = f"{path}.building"
+        if os.path.exists(building):
+            os.remove(building)
+        db = sqlite3.connect(building)
+        try:
+            db.execute("PRAGMA journal_mode = OFF")
+            db.execute("PRAGMA synchronous = OFF")
+            db.executescript(SCHEMA)
+            db.executemany(
+                "INSERT INTO devices VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        device.name,
+                        device.name.lower(),
+                        device.platform,
+                        device.site,
+                        device.ref_file,
+                    )
+                    for device in devices
+                ),
+            )
+            db.executemany(
+                "INSERT INTO networks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (row for device in devices for row in network_rows(device)),
+            )
+            db.execute(
+                "INSERT INTO prefix_lengths SELECT DISTINCT version, prefixlen FROM networks"
+            )
+            db.executemany(
+                "INSERT INTO arp VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (row for device in devices for row in arp_rows(device)),
+            )
+            db.executemany(
+                "INSERT INTO macs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row for device in devices for row in mac_rows(device)),
+            )
+            db.executescript(INDEXES)
+            db.commit()
+        finally:
+            db.close()
+        os.replace(building, path)
+        return cls(path)
+
+    def close(self):
+        self.db.close()
+
+    def lookup_ip(self, address, all_matches=False):
+        """Returns the networks holding an address, longest prefix first
+
+        Only the longest matching prefix is returned (every device holding it) unless all_matches is set.
+        """
+        ip = ipaddress.ip_address(address)
+        matches = []
+        for prefixlen in self.prefix_lengths[ip.version]:
+            network = ipaddress.ip_network((ip, prefixlen), strict=False)
+            rows = self.db.execute(
+                "SELECT address AS network, source, device, site, file FROM networks "
+                "WHERE version = ? AND prefixlen = ? AND network = ?",
+                (ip.version, prefixlen, network.network_address.packed),
+            ).fetchall()
+            if rows:
+                matches.extend(dict(row) for row in rows)
+                if not all_matches:
+                    break
+        return matches
+
+    def lookup_arp(self, address):
+        """Returns the ARP entries of an address"""
+        rows = self.db.execute(
+            "SELECT address, mac, interface, device, site, file FROM arp WHERE address_key = ?",
+            (address_key(address),),
+        )
+        return [dict(row) for row in rows]
+
+    def lookup_mac(self, mac):
+        """Returns the MAC table and ARP entries of a MAC address, in any notation"""
+        mac_key = normalize_mac(mac)
+        if mac_key is None:
+            raise ValueError(f"{mac} does not appear to be a MAC address")
+        rows = self.db.execute(
+            "SELECT mac, vlan, interface, NULL AS address, 'mac_table' AS source, device, site, file "
+            "FROM macs WHERE mac_key = ? UNION ALL "
+            "SELECT mac, NULL, interface, address, 'arp_table', device, site, file "
+            "FROM arp WHERE mac_key = ?",
+            (mac_key, mac_key),
+        )
+        return [dict(row) for row in rows]
+
+    def lookup_device(self, hostname):
+        """Returns the devices with a hostname, case insensitive"""
+        rows = self.db.execute(
+            "SELECT name, platform, site, file FROM devices WHERE name_key = ?",
+            (hostname.lower(),),
+        )
+        return [dict(row) for row in rows]
+
+    def lookup(self, query, all_matches=False):
+        """Looks a query up as an IP address, a MAC address or else a hostname, returns [(title, rows)]"""
+        try:
+            ipaddress.ip_address(query)
+        except ValueError:
+            pass
+        else:
+            return [
+                ("Networks", self.lookup_ip(query, all_matches)),
+                ("ARP Entries", self.lookup_arp(query)),
+            ]
+        if normalize_mac(query) is not None:
+            return [("MAC Address Entries", self.lookup_mac(query))]
+        return [("Devices", self.lookup_device(query))]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Looks up IP addresses, MAC addresses and hostnames in the fleet index of a previous run"
+    )
+    parser.add_argument(
+        "queries", nargs="+", help="IP addresses, MAC addresses or hostnames"
+    )
+    parser.add_argument(
+        "--index",
+        default="fleet_index.sqlite",
+        help="fleet index built by run_parser.py --fleet-index (default: fleet_index.sqlite)",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="list every network holding an IP address, not only the longest prefix",
+    )
+    args = parser.parse_args()
+
+    try:
+        index = FleetIndex(args.index)
+    except Exception as e:
+        error("Ouch!", e.__class__, "occurred.", e)
+        raise SystemExit(1)
+    for query in args.queries:
+        start = time.perf_counter()
+        results = index.lookup(query, args.all)
+        elapsed = (time.perf_counter() - start) * 1e3
+        print(f"\n[bold green]{query}[/] ({elapsed:.1f} ms)")
+        for title, rows in results:
+            if not rows:
+                print(f"[bold red]No {title} found!")
+                continue
+            print(f"\n[bold red]{title}:\n")
+            print(tabulate(rows, headers="keys", tablefmt="github"))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import ipaddress
+from collections import Counter
+from itertools import islice
+import numpy as np
+
+CONFLICT_COLUMNS = [
+    "conflict",
+    "network",
+    "source",
+    "device",
+    "site",
+    "file",
+    "conflicting_network",
+    "conflicting_devices",
+    "conflicting_sites",
+    "conflicting_device_count",
+    "conflicting_site_count",
+    "cross_site",
+]
+
+# Conflicting devices and sites listed per row, the counts give the full number
+CONFLICT_SAMPLE = 10
+
+
+class NetworkHolders:
+    """Devices and sites holding a network, gathered once so each of its k members is reported without
+    rescanning the other k - 1
+    """
+
+    def __init__(self, members) -> None:
+        self.site_devices = {}
+        for _, device, site, _ in members:
+            self.site_devices.setdefault(site, set()).add(device)
+        self.device_set = {member[1] for member in members}
+        self.devices = sorted(self.device_set)
+        self.sites = sorted(self.site_devices)
+        # Sites where a device is the only holder are not conflicting sites for that device
+        self.sole_sites = Counter(
+            next(iter(devices))
+            for devices in self.site_devices.values()
+            if len(devices) == 1
+        )
+
+    def other_device_count(self, device):
+        return len(self.devices) - (device in self.device_set)
+
+    def other_devices(self, device):
+        return list(
+            islice((name for name in self.devices if name != device), CONFLICT_SAMPLE)
+        )
+
+    def holds_other(self, site, device):
+        devices = self.site_devices.get(site)
+        return devices is not None and devices != {device}
+
+    def other_site_count(self, device):
+        return len(self.sites) - self.sole_sites[device]
+
+    def other_sites(self, device):
+        return list(
+            islice(
+                (site for site in self.sites if self.holds_other(site, device)),
+                CONFLICT_SAMPLE,
+            )
+        )
+
+
+def network_sweep(starts, ends):
+    """Returns the parent of each network (the closest network holding it, -1 for none)
+
+    Networks are given sorted by start then by prefix length, broadest first. CIDR networks are either
+    nested or disjoint, so a single pass keeping the chain of networks still open finds every parent.
+    """
+    parents = [-1] * len(starts)
+    open_networks = []
+    for network, (start, end) in enumerate(zip(starts, ends)):
+        while open_networks and ends[open_networks[-1]] < start:
+            open_networks.pop()
+        if open_networks:
+            parents[network] = open_networks[-1]
+        open_networks.append(network)
+    return parents
+
+
+def find_conflicts(table):
+    """Yields CONFLICT_COLUMNS rows of the networks of a NetworkTable held by more than one device
+
+    Distinct networks are sorted once and swept for containment, so the whole fleet is checked in
+    O(n log n) rather than by comparing every pair. As CIDR networks cannot partially overlap, every
+    overlap is either a duplicate (the same network on another device) or a containment (the network lies
+    within a broader network of another device, the closest one is reported). Networks of the same device
+    never conflict, neither do two routing table networks as routing tables repeat and summarize the
+    networks of other devices by design. Default routes are left out. The devices and sites of each
+    network are gathered once and each row lists at most CONFLICT_SAMPLE of them next to their counts, so
+    a network held by thousands of devices still yields one short row per device.
+    """
+    frame = table.frame
+    if not len(frame):
+        return
+    first_rows, codes = table.unique_networks()
+    keys = frame.iloc[first_rows]
+    # Sort distinct networks by version, network address, then broadest first
+    order = np.lexsort(
+        (
+            keys["prefixlen"].to_numpy(),
+            keys["network_lo"].to_numpy(),
+            keys["network_hi"].to_numpy(),
+            keys["version"].to_numpy(),
+        )
+    )
+    versions = keys["version"].to_numpy()[order].tolist()
+    prefixlens = keys["prefixlen"].to_numpy()[order].tolist()
+    # Versions are kept apart by giving each its own range of sweep positions
+    starts = [
+        (version << 128) | (hi << 64) | lo
+        for version, hi, lo in zip(
+            versions,
+            keys["network_hi"].to_numpy()[order].tolist(),
+            keys["network_lo"].to_numpy()[order].tolist(),
+        )
+    ]
+    ends = [
+        (version << 128) | (hi << 64) | lo
+        for version, hi, lo in zip(
+            versions,
+            keys["broadcast_hi"].to_numpy()[order].tolist(),
+            keys["broadcast_lo"].to_numpy()[order].tolist(),
+        )
+    ]
+    parents = network_sweep(starts, ends)
+
+    # Only networks held more than once or nested in another one can conflict, and only they and the
+    # networks holding them need their members (source, device, site, file)
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    row_networks = position[codes]
+    candidates = np.bincount(row_networks, minlength=len(order)) > 1
+    parents_array = np.array(parents, dtype=np.int64)
+    candidates |= parents_array != -1
+    needed = candidates.copy()
+    needed[parents_array[parents_array != -1]] = True
+    rows = np.flatnonzero(needed[row_networks])
+    members = {}
+    for network, source, device, site, ref_file in zip(
+        row_networks[rows].tolist(),
+        frame["source"].iloc[rows].astype(object),
+        frame["device"].iloc[rows].astype(object),
+        frame["site"].iloc[rows].astype(object),
+        frame["file"].iloc[rows].astype(object),
+    ):
+        members.setdefault(network, []).append((source, device, site, ref_file))
+
+    def network_name(network):
+        address = starts[network] & ((1 << 128) - 1)
+        return ipaddress.ip_network((address, prefixlens[network])).with_prefixlen
+
+    holders = {}
+
+    def network_holders(network, source):
+        # Routing table networks only conflict with the networks of other sources
+        key = (network, source == "routing_table")
+        if key not in holders:
+            holders[key] = NetworkHolders(
+                [
+                    member
+                    for member in members[network]
+                    if not (key[1] and member[0] == "routing_table")
+                ]
+            )
+        return holders[key]
+
+    for network in np.flatnonzero(candidates).tolist():
+        if prefixlens[network] == 0:
+            continue
+        for source, device, site, ref_file in members[network]:
+            others = network_holders(network, source)
+            if others.other_device_count(device):
+                conflict, conflicting_network = "duplicate", network
+            else:
+                # Closest broader network held by another device
+                conflicting_network = parents[network]
+                while conflicting_network != -1:
+                    if prefixlens[conflicting_network] == 0:
+                        conflicting_network = -1
+                        break
+                    others = network_holders(conflicting_network, source)
+                    if others.other_device_count(device):
+                        break
+                    conflicting_network = parents[conflicting_network]
+                if conflicting_network == -1:
+                    continue
+                conflict = "contained"
+            other_site_count = others.other_site_count(device)
+            yield (
+                conflict,
+                network_name(network),
+                source,
+                device,
+                site,
+                ref_file,
+                network_name(conflicting_network),
+                "; ".join(others.other_devices(device)),
+                "; ".join(others.other_sites(device)),
+                others.other_device_count(device),
+                other_site_count,
+                other_site_count > others.holds_other(site, device),
+            )
@@ -0,0 +1,305 @@
+import ipaddress
+import numpy as np
+import pandas as pd
+from constants import IPV4_LOOPBACK_NETWORKS, IPV4_PRIVATE_EXCEPTIONS
+from constants import IPV4_PRIVATE_NETWORKS, IPV4_RESERVED_NETWORKS
+
+UINT64_MASK = (1 << 64) - 1
+IPV4_NETMASKS = np.array(
+    [str(ipaddress.IPv4Network((0, prefixlen)).netmask) for prefixlen in range(33)],
+    dtype=object,
+)
+
+
+def address_ranges(networks):
+    """(first address, last address) integers of networks given as strings"""
+    return [
+        (int(network.network_address), int(network.broadcast_address))
+        for network in map(ipaddress.IPv4Network, networks)
+    ]
+
+
+# Ranges of is_private, is_loopback and is_reserved, tested for every IPv4 network at once
+IPV4_PRIVATE = address_ranges(IPV4_PRIVATE_NETWORKS)
+IPV4_PRIVATE_EXCEPTION_RANGES = address_ranges(IPV4_PRIVATE_EXCEPTIONS)
+IPV4_LOOPBACK = address_ranges(IPV4_LOOPBACK_NETWORKS)
+IPV4_RESERVED = address_ranges(IPV4_RESERVED_NETWORKS)
+
+NETWORK_COLUMNS = [
+    "Header-Network",
+    "address",
+    "netmask",
+    "description",
+    "device",
+    "source",
+    "platform",
+    "site",
+    "public_overlap",
+    "public_overlap_cidr",
+    "is_private",
+    "is_loopback",
+    "is_reserved",
+    "file",
+]
+INTERFACE_COLUMNS = [
+    "Header-Network",
+    "address",
+    "netmask",
+    "description",
+    "device",
+    "interface_ip",
+    "platform",
+    "site",
+    "public_overlap",
+    "public_overlap_cidr",
+    "is_private",
+    "is_loopback",
+    "is_reserved",
+    "file",
+]
+
+
+def within_ranges(start, end, ranges):
+    """Vectorized test of which [start, end] rows lie entirely within one of the ranges"""
+    result = np.zeros(len(start), dtype=bool)
+    for low, high in ranges:
+        result |= (start >= low) & (end <= high)
+    return result
+
+
+def touches_ranges(start, end, ranges):
+    """Vectorized test of which [start, end] rows begin or end inside one of the ranges"""
+    result = np.zeros(len(start), dtype=bool)
+    for low, high in ranges:
+        result |= ((start >= low) & (start <= high)) | ((end >= low) & (end <= high))
+    return result
+
+
+def format_ipv4(values):
+    """Formats an array of IPv4 integers as dotted quad strings"""
+    octets = [
+        pd.Series((values >> shift) & 255).astype(str) for shift in (24, 16, 8, 0)
+    ]
+    return octets[0].str.cat(octets[1:], sep=".").to_numpy(dtype=object)
+
+
+class NetworkTableBuilder:
+    """Collects interface and route networks as integers and strings before building a NetworkTable"""
+
+    def __init__(self) -> None:
+        self.columns = {
+            "version": [],
+            "address": [],
+            "prefixlen": [],
+            "device": [],
+            "site": [],
+            "file": [],
+            "platform": [],
+            "source": [],
+        }
+
+    def add(self, version, address, prefixlen, device, source):
+        self.columns["version"].append(version)
+        self.columns["address"].append(address)
+        self.columns["prefixlen"].append(prefixlen)
+        self.columns["device"].append(device.name)
+        self.columns["site"].append(device.site)
+        self.columns["file"].append(device.ref_file)
+        self.columns["platform"].append(device.platform)
+        self.columns["source"].append(source)
+
+    def add_interface(self, interface, device):
+        self.add(
+            interface.version,
+            interface.address,
+            interface.prefixlen,
+            device,
+            "interface",
+        )
+
+    def add_networks(
+        self, version, addresses, prefixlens, device, source="routing_table"
+    ):
+        """Adds a batch of networks of a device given as integer address and prefix length arrays"""
+        count = len(addresses)
+        self.columns["version"].extend([version] * count)
+        self.columns["address"].extend(addresses.tolist())
+        self.columns["prefixlen"].extend(prefixlens.tolist())
+        for column, value in (
+            ("device", device.name),
+            ("site", device.site),
+            ("file", device.ref_file),
+            ("platform", device.platform),
+            ("source", source),
+        ):
+            self.columns[column].extend([value] * count)
+
+    def build(self):
+        addresses = self.columns["address"]
+        frame = pd.DataFrame(
+            {
+                "version": np.array(self.columns["version"], dtype=np.uint8),
+                "address_hi": np.array(
+                    [address >> 64 for address in addresses], dtype=np.uint64
+                ),
+                "address_lo": np.array(
+                    [address & UINT64_MASK for address in addresses], dtype=np.uint64
+                ),
+                "prefixlen": np.array(self.columns["prefixlen"], dtype=np.uint8),
+            }
+        )
+        for column in ("device", "site", "file", "platform", "source"):
+            frame[column] = pd.Categorical(self.columns[column])
+        return NetworkTable(frame)
+
+
+class NetworkTable:
+    """Columnar table of interface and route networks
+
+    Addresses are held as two uint64 columns (IPv6 uses both halves, IPv4 only the low half) next to
+    their prefix length, so sorting, dedup and classification run as vectorized operations.
+    """
+
+    def __init__(self, frame) -> None:
+        self.frame = frame.reset_index(drop=True)
+        if "network_hi" not in self.frame:
+            self.add_network_columns()
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def concat(cls, tables):
+        frame = pd.concat(
+            [table.frame for table in tables], ignore_index=True, copy=False
+        )
+        for column in ("device", "site", "file", "platform", "source"):
+            frame[column] = frame[column].astype("category")
+        return cls(frame)
+
+    def add_network_columns(self):
+        frame = self.frame
+        host_bits = np.where(frame["version"] == 6, 128, 32) - frame[
+            "prefixlen"
+        ].to_numpy(dtype=np.int64)
+        ones = np.uint64(UINT64_MASK)
+        # Host bits are split across the two halves, numpy shifts of 64 bits or more are undefined
+        lo_bits = np.minimum(host_bits, 64).astype(np.uint64)
+        hi_bits = np.clip(host_bits - 64, 0, 64).astype(np.uint64)
+        lo_host = np.where(
+            lo_bits >= 64, ones, (np.uint64(1) << (lo_bits % np.uint64(64))) - 1
+        )
+        hi_host = np.where(
+            hi_bits >= 64, ones, (np.uint64(1) << (hi_bits % np.uint64(64))) - 1
+        )
+        frame["network_hi"] = frame["address_hi"].to_numpy() & ~hi_host
+        frame["network_lo"] = frame["address_lo"].to_numpy() & ~lo_host
+        frame["broadcast_hi"] = frame["network_hi"].to_numpy() | hi_host
+        frame["broadcast_lo"] = frame["network_lo"].to_numpy() | lo_host
+
+    def sorted(self, by_address=False):
+        """Returns a copy sorted by network then prefix length (and address), ties keep their order"""
+        keys = ["address_lo", "address_hi"] if by_address else []
+        keys += ["prefixlen", "network_lo", "network_hi", "version"]
+        order = np.lexsort([self.frame[key].to_numpy() for key in keys])
+        return NetworkTable(self.frame.take(order))
+
+    def unique_networks(self):
+        """Returns (row positions of each distinct network, index into them for every row)"""
+        keys = self.frame[["version", "network_hi", "network_lo", "prefixlen"]]
+        codes = keys.groupby(list(keys.columns), sort=False, observed=True).ngroup()
+        codes = codes.to_numpy()
+        _, first_rows = np.unique(codes, return_index=True)
+        return first_rows, codes
+
+    def network_objects(self, rows):
+        frame = self.frame
+        return [
+            ipaddress.ip_network(
+                (
+                    (int(frame["network_hi"].iat[row]) << 64)
+                    | int(frame["network_lo"].iat[row]),
+                    int(frame["prefixlen"].iat[row]),
+                )
+            )
+            for row in rows
+        ]
+
+    def classify_public_overlap(self, aggregate_index):
+        """Adds public_overlap/public_overlap_cidr, looking up each distinct network only once"""
+        frame = self.frame
+        first_rows, codes = self.unique_networks()
+        overlap = np.full(len(first_rows), "No Issue", dtype=object)
+        overlap_cidr = np.full(len(first_rows), "", dtype=object)
+        for code, network in enumerate(self.network_objects(first_rows)):
+            if network.with_prefixlen != "0.0.0.0/0":
+                overlap[code], overlap_cidr[code] = aggregate_index.classify(network)
+        frame["public_overlap"] = overlap[codes]
+        frame["public_overlap_cidr"] = overlap_cidr[codes]
+
+    def classify_address_types(self):
+        """Adds is_private/is_loopback/is_reserved for every network"""
+        frame = self.frame
+        is_ipv4 = (frame["version"] == 4).to_numpy()
+        start = frame["network_lo"].to_numpy()
+        end = frame["broadcast_lo"].to_numpy()
+        is_private = within_ranges(start, end, IPV4_PRIVATE) & ~touches_ranges(
+            start, end, IPV4_PRIVATE_EXCEPTION_RANGES
+        )
+        is_loopback = within_ranges(start, end, IPV4_LOOPBACK)
+        is_reserved = within_ranges(start, end, IPV4_RESERVED)
+        frame["is_private"] = is_private & is_ipv4
+        frame["is_loopback"] = is_loopback & is_ipv4
+        frame["is_reserved"] = is_reserved & is_ipv4
+        # IPv6 networks are rare in configurations and are classified by ipaddress
+        ipv6_rows = np.flatnonzero(~is_ipv4)
+        for row, network in zip(ipv6_rows, self.network_objects(ipv6_rows)):
+            frame.loc[row, "is_private"] = network.is_private
+            frame.loc[row, "is_loopback"] = network.is_loopback
+            frame.loc[row, "is_reserved"] = network.is_reserved
+
+    def format_column(self, hi_column, lo_column, exploded=True):
+        frame = self.frame
+        formatted = format_ipv4(frame[lo_column].to_numpy())
+        for row in np.flatnonzero((frame["version"] == 6).to_numpy()):
+            address = ipaddress.IPv6Address(
+                (int(frame[hi_column].iat[row]) << 64) | int(frame[lo_column].iat[row])
+            )
+            formatted[row] = address.exploded if exploded else address.compressed
+        return formatted
+
+    def netmasks(self):
+        frame = self.frame
+        netmasks = IPV4_NETMASKS[np.minimum(frame["prefixlen"].to_numpy(), 32)]
+        for row in np.flatnonzero((frame["version"] == 6).to_numpy()):
+            netmasks[row] = ipaddress.IPv6Network(
+                (0, int(frame["prefixlen"].iat[row]))
+            ).netmask.exploded
+        return netmasks
+
+    def report(self, columns=NETWORK_COLUMNS):
+        """Builds the InfoBlox style network report from the table"""
+        frame = self.frame
+        report = pd.DataFrame(index=frame.index)
+        for column in columns:
+            if column == "Header-Network":
+                report[column] = "Network"
+            elif column == "address":
+                report[column] = self.format_column("network_hi", "network_lo")
+            elif column == "netmask":
+                report[column] = self.netmasks()
+            elif column == "description":
+                report[column] = ""
+            elif column == "interface_ip":
+                report[column] = pd.Series(
+                    self.format_column("address_hi", "address_lo", exploded=False)
+                ).str.cat(frame["prefixlen"].astype(str), sep="/")
+            else:
+                report[column] = frame[column].astype(object)
+        return report
+
+    def report_rows(self, columns=NETWORK_COLUMNS, chunk_size=65536):
+        """Yields report rows as tuples, formatting chunk_size rows at a time"""
+        for start in range(0, len(self.frame), chunk_size):
+            chunk = NetworkTable(self.frame.iloc[start : start + chunk_size])
+            yield from chunk.report(columns).itertuples(index=False, name=None)
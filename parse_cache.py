@@ -0,0 +1,92 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from constants import PARSER_VERSION
+
+
+def template_set_version():
+    try:
+        return version("ntc_templates")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class ParseCache:
+    """On-disk cache of parse results keyed by a content hash, the parser version and the template set
+
+    Entries are pickled files named after their key. Hits refresh the file modification time so the least
+    recently used entries are evicted first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory=".parse_cache", max_bytes=1024**3) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.signature = f"{PARSER_VERSION}\n{template_set_version()}".encode()
+
+    def key(self, kind, *parts):
+        """Hashes the content parts of an entry together with the parser and template versions"""
+        digest = hashlib.sha256(self.signature)
+        digest.update(kind.encode())
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pickle")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt or truncated entries are treated as a miss and rewritten
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent workers never read a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits within max_bytes"""
+        entries = []
+        total_bytes = 0
+        if not os.path.isdir(self.directory):
+            return 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            removed += 1
+        return removed
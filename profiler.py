@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+class Profiler:
+    """Records wall time, CPU time and bytes processed for spans of work as Chrome trace events
+
+    Spans are categorized by stage (read, slice, config, template, ...) and carry arguments such as the file
+    or command they belong to, spans of the "run" category time whole phases of a run. Recording is off
+    until enabled, so instrumented code costs next to nothing in normal runs. Worker processes record into
+    their own profiler and hand their events back to the parent.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events = []
+        # Events of tasks run by ProfiledTask, kept per thread so threads running tasks next to the
+        # recording thread never pick up each other's events
+        self.task_events = threading.local()
+
+    def enable(self):
+        self.enabled = True
+
+    def span(self, name, category, **args):
+        """Context manager timing a span, yields the event so bytes can be added once they are known"""
+        if not self.enabled:
+            return nullcontext({})
+        return self.record(name, category, args)
+
+    @contextmanager
+    def record(self, name, category, args):
+        args.setdefault("bytes", 0)
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "args": args,
+        }
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            event["ts"] = start * 1e6
+            event["dur"] = (time.perf_counter() - start) * 1e6
+            args["cpu_ms"] = round((time.process_time() - cpu_start) * 1e3, 3)
+            events = getattr(self.task_events, "events", None)
+            (self.events if events is None else events).append(event)
+
+    def write_trace(self, file_name):
+        """Writes the events as Chrome trace JSON (chrome://tracing or https://ui.perfetto.dev)"""
+        origin = min((event["ts"] for event in self.events), default=0)
+        trace_events = [{**event, "ts": event["ts"] - origin} for event in self.events]
+        with open(file_name, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+    def totals(self, key):
+        """Sums wall time, CPU time and bytes of events grouped by key(event), slowest first"""
+        totals = defaultdict(lambda: [0, 0.0, 0.0, 0])
+        for event in self.events:
+            group = key(event)
+            if group is None:
+                continue
+            total = totals[group]
+            total[0] += 1
+            total[1] += event["dur"] / 1e6
+            total[2] += event["args"]["cpu_ms"] / 1e3
+            total[3] += event["args"]["bytes"]
+        return sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+
+    def summary(self, limit=10):
+        """Returns tables of time per stage and the slowest files and templates"""
+        from tabulate import tabulate
+
+        headers = ["count", "wall (s)", "cpu (s)", "MB", "MB/sec"]
+
+        def rows(totals):
+            return [
+                [
+                    *group,
+                    count,
+                    round(wall, 3),
+                    round(cpu, 3),
+                    round(nbytes / 1024**2, 2),
+                    round(nbytes / 1024**2 / wall, 2) if wall and nbytes else "",
+                ]
+                for group, (count, wall, cpu, nbytes) in totals
+            ]
+
+        phases = rows(
+            self.totals(
+                lambda event: (event["name"],) if event["cat"] == "run" else None
+            )
+        )
+        stages = rows(
+            self.totals(
+                lambda event: (event["cat"],) if event["cat"] != "run" else None
+            )
+        )
+        files = rows(
+            self.totals(
+                lambda event: (
+                    (event["args"]["file"],) if "file" in event["args"] else None
+                )
+            )[:limit]
+        )
+        templates = rows(
+            self.totals(
+                lambda event: (
+                    (event["args"]["platform"], event["name"])
+                    if event["cat"] == "template"
+                    else None
+                )
+            )[:limit]
+        )
+        return [
+            ("Run phases", tabulate(phases, ["phase", *headers], "github")),
+            ("Time per stage", tabulate(stages, ["stage", *headers], "github")),
+            ("Slowest files", tabulate(files, ["file", *headers], "github")),
+            (
+                "Slowest templates",
+                tabulate(templates, ["platform", "command", *headers], "github"),
+            ),
+        ]
+
+
+class ProfiledTask:
+    """Wraps a worker function so it records into the worker's profiler and returns (result, events)"""
+
+    def __init__(self, function) -> None:
+        self.function = function
+
+    def __call__(self, task):
+        profiler.enable()
+        profiler.task_events.events = events = []
+        try:
+            result = self.function(task)
+        finally:
+            profiler.task_events.events = None
+        return result, events
+
+
+# Profiler of the current process
+profiler = Profiler()
@@ -0,0 +1,341 @@
+import csv
+import ipaddress
+import os
+import re
+from console import console, error, print
+from profiler import profiler
+
+# pyarrow is only needed for Parquet and Arrow datasets, it is imported by the first ReportDatasets
+pa = pq = None
+
+
+def import_pyarrow():
+    global pa, pq
+    if pa is None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+
+# Dataset columns that are written as booleans or integers, every other report column is written as a string
+BOOLEAN_COLUMNS = {
+    "routing_table",
+    "arp_table",
+    "mac_table",
+    "dhcp_server",
+    "nat",
+    "is_private",
+    "is_loopback",
+    "is_reserved",
+    "cross_site",
+    "ambiguous",
+}
+INTEGER_COLUMNS = {
+    "port_macs",
+    "conflicting_device_count",
+    "conflicting_site_count",
+}
+
+# Address columns (and the column holding their mask) converted to integer columns in datasets, in order
+# of precedence as only the first one found in a report is converted
+ADDRESS_COLUMNS = [("address", "netmask"), ("network", "mask"), ("ipaddress", None)]
+
+# Integer columns added to datasets holding an address: IPv6 uses both halves, IPv4 only the low half
+INTEGER_ADDRESS_COLUMNS = ["version", "address_hi", "address_lo", "prefixlen"]
+
+
+class ReportWorkbook:
+    """Write-only XLSX workbook, rows appended to its sheets are streamed to disk instead of kept in memory"""
+
+    def __init__(self, file_name="ipam_report.xlsx") -> None:
+        from openpyxl import Workbook
+
+        self.file_name = file_name
+        self.workbook = Workbook(write_only=True)
+
+    def sheet(self, title):
+        worksheet = self.workbook.create_sheet(title)
+        worksheet.freeze_panes = "A2"
+        return worksheet
+
+    def close(self):
+        with profiler.span(self.file_name, "xlsx"):
+            try:
+                self.workbook.save(self.file_name)
+            except Exception as e:
+                error("Ouch!", e.__class__, "occurred.")
+
+
+def integer_address(address, mask=None):
+    """Returns (version, address_hi, address_lo, prefixlen) of an address and its mask, Nones when invalid
+
+    Masks may be prefix lengths or IPv4/IPv6 netmasks, addresses without a mask are host addresses unless
+    they are written with their prefix length (10.0.0.0/24).
+    """
+    address = str(address).strip()
+    if (mask is None or mask == "") and "/" in address:
+        address, mask = address.split("/", 1)
+    try:
+        ip = ipaddress.ip_address(address)
+        if mask is None or mask == "":
+            prefixlen = ip.max_prefixlen
+        elif str(mask).strip().isdigit():
+            prefixlen = int(mask)
+        else:
+            prefixlen = bin(int(ipaddress.ip_address(str(mask).strip()))).count("1")
+        if prefixlen > ip.max_prefixlen:
+            raise ValueError(f"{mask} is not a valid mask")
+    except ValueError:
+        return None, None, None, None
+    return ip.version, int(ip) >> 64, int(ip) & ((1 << 64) - 1), prefixlen
+
+
+def column_type(fieldname):
+    """Arrow type of a report column in datasets"""
+    if fieldname in BOOLEAN_COLUMNS:
+        return pa.bool_()
+    if fieldname in INTEGER_COLUMNS:
+        return pa.int64()
+    return pa.string()
+
+
+class ReportDataset:
+    """Worksheet-like sink streaming report rows to a Parquet file or Arrow IPC file with typed columns
+
+    The first row appended is the header. Rows are converted into record batches of batch_size rows.
+    Booleans and counts keep their type, the first address column is also written as integers (INTEGER_ADDRESS_COLUMNS)
+    and every other value is written as a string, as it is in the CSV report.
+    """
+
+    def __init__(self, file_name, file_format="parquet", batch_size=65536) -> None:
+        self.file_name = file_name
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.fieldnames = None
+        self.address_columns = None
+        self.rows = []
+        self.schema = None
+        self.writer = None
+
+    def append(self, values):
+        if self.fieldnames is None:
+            self.fieldnames = list(values)
+            for address_column, mask_column in ADDRESS_COLUMNS:
+                if address_column in self.fieldnames:
+                    self.address_columns = (
+                        self.fieldnames.index(address_column),
+                        (
+                            self.fieldnames.index(mask_column)
+                            if mask_column in self.fieldnames
+                            else None
+                        ),
+                    )
+                    break
+            return
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def build_schema(self):
+        fields = [
+            pa.field(fieldname, column_type(fieldname)) for fieldname in self.fieldnames
+        ]
+        if self.address_columns is not None:
+            fields += [
+                pa.field("version", pa.uint8()),
+                pa.field("address_hi", pa.uint64()),
+                pa.field("address_lo", pa.uint64()),
+                pa.field("prefixlen", pa.uint8()),
+            ]
+        return pa.schema(fields)
+
+    def record_batch(self, schema):
+        columns = []
+        for index, fieldname in enumerate(self.fieldnames):
+            values = [row[index] for row in self.rows]
+            if fieldname in BOOLEAN_COLUMNS:
+                values = [None if value is None else bool(value) for value in values]
+            elif fieldname in INTEGER_COLUMNS:
+                values = [None if value is None else int(value) for value in values]
+            else:
+                values = [None if value is None else str(value) for value in values]
+            columns.append(values)
+        if self.address_columns is not None:
+            address_index, mask_index = self.address_columns
+            addresses = [
+                integer_address(
+                    row[address_index], None if mask_index is None else row[mask_index]
+                )
+                for row in self.rows
+            ]
+            columns += [list(column) for column in zip(*addresses)] or [
+                [] for _ in INTEGER_ADDRESS_COLUMNS
+            ]
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+
+    def flush(self):
+        with profiler.span(self.file_name, self.file_format, rows=len(self.rows)):
+            if self.writer is None:
+                self.schema = self.build_schema()
+                if self.file_format == "parquet":
+                    self.writer = pq.ParquetWriter(self.file_name, self.schema)
+                else:
+                    self.writer = pa.ipc.new_file(self.file_name, self.schema)
+            self.writer.write_batch(self.record_batch(self.schema))
+        self.rows = []
+
+    def close(self):
+        # Reports that never received a header have no schema, no file is written for them
+        if self.fieldnames is None:
+            return
+        self.flush()
+        self.writer.close()
+
+
+class ReportDatasets:
+    """Writes each report as a Parquet or Arrow IPC dataset in a directory, in place of the XLSX workbook"""
+
+    def __init__(self, directory="ipam_datasets", file_format="parquet") -> None:
+        try:
+            import_pyarrow()
+        except ImportError:
+            raise ImportError(f"pyarrow is required to write {file_format} datasets")
+        self.directory = directory
+        self.file_format = file_format
+        self.datasets = []
+        os.makedirs(directory, exist_ok=True)
+
+    def sheet(self, title):
+        """Returns the dataset of a report, named after the worksheet title it replaces"""
+        name = re.sub(r"\W+", "_", title).strip("_").lower()
+        extension = "parquet" if self.file_format == "parquet" else "arrow"
+        dataset = ReportDataset(
+            os.path.join(self.directory, f"{name}.{extension}"), self.file_format
+        )
+        self.datasets.append(dataset)
+        return dataset
+
+    def close(self):
+        for dataset in self.datasets:
+            try:
+                dataset.close()
+            except Exception as e:
+                error("Ouch!", e.__class__, "occurred.")
+                continue
+            if dataset.fieldnames is not None:
+                print(
+                    f'\n[bold green]File "{dataset.file_name}" has been successfully created\n'
+                )
+
+
+def table_columns(tables, extra_columns=()):
+    """Union of the headers of ParsedTables in the order first found, followed by extra_columns
+
+    Devices of different platforms parse the same command with different templates, a report of their
+    records needs every field of every template. Returns [] when no table holds records.
+    """
+    columns = {}
+    for table in tables:
+        if table:
+            columns.update(dict.fromkeys(table.header))
+    if not columns:
+        return []
+    return [column for column in columns if column not in extra_columns] + list(
+        extra_columns
+    )
+
+
+class ReportWriter:
+    """Streams report rows to a CSV file and a worksheet as they are produced
+
+    Only the first preview_rows rows are kept, they are printed to the console once the report is closed.
+    When no fieldnames are given, they are taken from the keys of the first row written, pass them when
+    later rows may hold other keys.
+    """
+
+    def __init__(
+        self,
+        file_name,
+        friendly_description,
+        worksheet=None,
+        fieldnames=None,
+        preview_rows=20,
+    ) -> None:
+        self.file_name = file_name
+        self.friendly_description = friendly_description
+        self.worksheet = worksheet
+        self.fieldnames = None
+        self.preview_rows = preview_rows
+        self.preview = []
+        self.row_count = 0
+        try:
+            self.csvfile = open(file_name, "w", newline="")
+            self.csv_writer = csv.writer(self.csvfile)
+        except Exception as e:
+            error("Ouch!", e.__class__, "occurred.")
+            self.csvfile = self.csv_writer = None
+        if fieldnames is not None:
+            self.write_header(fieldnames)
+
+    def write_header(self, fieldnames):
+        self.fieldnames = list(fieldnames)
+        self.field_set = set(self.fieldnames)
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(self.fieldnames)
+        if self.worksheet is not None:
+            self.worksheet.append(self.fieldnames)
+
+    def write(self, row):
+        """Writes a dict row, fields it lacks are left empty and keys that are not among the fieldnames raise
+        ValueError rather than being dropped
+        """
+        if self.fieldnames is None:
+            self.write_header(row.keys())
+        elif not self.field_set.issuperset(row):
+            unknown = ", ".join(key for key in row if key not in self.field_set)
+            raise ValueError(f"{unknown} not among the columns of {self.file_name}")
+        self.write_values([row.get(fieldname) for fieldname in self.fieldnames])
+
+    def write_rows(self, rows):
+        """Writes rows of values in fieldnames order"""
+        for values in rows:
+            self.write_values(values)
+
+    def write_values(self, values):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(values)
+        if self.worksheet is not None:
+            self.worksheet.append(values)
+        if self.row_count < self.preview_rows:
+            self.preview.append(values)
+        self.row_count += 1
+
+    def close(self):
+        if self.csvfile is not None:
+            self.csvfile.close()
+            print(
+                f'\n[bold green]File "{self.file_name}" has been successfully created\n'
+            )
+        console.log("report", file=self.file_name, rows=self.row_count)
+        # Print a preview of the report to the console in table format
+        if not console.rich_output:
+            return
+        if not self.row_count:
+            print(f"[bold red]No {self.friendly_description} found!")
+            return
+        from tabulate import tabulate
+
+        with profiler.span(self.file_name, "console"):
+            print(f"\n[bold red]{self.friendly_description}:\n")
+            if self.preview:
+                print(tabulate(self.preview, self.fieldnames, tablefmt="github"))
+            if self.row_count > len(self.preview):
+                print(
+                    f"\n... {self.row_count - len(self.preview)} more of {self.row_count} rows in {self.file_name}"
+                )
+            print("\n" * 2)
@@ -0,0 +1,119 @@
+import ipaddress
+from collections import namedtuple
+import numpy as np
+from address_extractor import packed_ipv4
+
+# Normalized route field: field of the platform's TextFSM routing table template
+# Platforms are added here, platforms without a map are read with DEFAULT_ROUTE_FIELDS
+ROUTE_FIELD_MAPS = {
+    "hp_comware": {
+        "protocol": "protocal",
+        "network": "network",
+        "mask": "mask",
+        "nexthop_ip": "nexthop_ip",
+    },
+    "cisco_ios": {
+        "protocol": "protocol",
+        "network": "network",
+        "mask": "mask",
+        "nexthop_ip": "nexthop_ip",
+    },
+    "checkpoint_gaia": {
+        "protocol": "protocol",
+        "network": "network",
+        "mask": "mask",
+        "nexthop_ip": "nexthopip",
+    },
+}
+DEFAULT_ROUTE_FIELDS = {
+    "protocol": "protocol",
+    "network": "network",
+    "mask": "mask",
+    "nexthop_ip": "nexthop_ip",
+}
+ROUTE_FIELDS = ["protocol", "network", "mask", "nexthop_ip"]
+
+# A route whose network and mask do not form a valid IPv4 network, row is its position in the table
+RouteError = namedtuple("RouteError", ["row", "network", "mask", "error"])
+
+
+class NormalizedRoutes(
+    namedtuple(
+        "NormalizedRoutes",
+        [*ROUTE_FIELDS, "addresses", "prefixlens", "valid", "errors"],
+    )
+):
+    """Routing table in normalized columns
+
+    protocol, network, mask and nexthop_ip hold the template values of every row. addresses (uint32) and
+    prefixlens (uint8) hold the network of every row, valid flags the rows whose network could be read and
+    errors lists the others.
+    """
+
+    __slots__ = ()
+
+    def details(self):
+        """Yields (protocol, network, mask, nexthop_ip) of every row"""
+        return zip(self.protocol, self.network, self.mask, self.nexthop_ip)
+
+    def sorted_networks(self):
+        """Returns (addresses, prefixlens) of the valid rows, sorted by address then prefix length"""
+        addresses = self.addresses[self.valid]
+        prefixlens = self.prefixlens[self.valid]
+        order = np.lexsort((prefixlens, addresses))
+        return addresses[order], prefixlens[order]
+
+
+def parse_ipv4_network(network, mask):
+    """Returns (address, prefixlen) of a network, raising ValueError exactly as IPv4Network(f"{network}/{mask}")"""
+    packed = packed_ipv4(network)
+    if packed is not None and isinstance(mask, str) and mask.isdigit():
+        prefixlen = int(mask)
+        address = int.from_bytes(packed, "big")
+        if prefixlen <= 32 and address & ((1 << (32 - prefixlen)) - 1) == 0:
+            return address, prefixlen
+    # Netmasks, host bits set and anything unusual take the ipaddress path
+    network = ipaddress.IPv4Network(f"{network}/{mask}")
+    return int(network.network_address), network.prefixlen
+
+
+class RouteNormalizer:
+    """Normalizes the routing tables of every platform into the same typed columns
+
+    Each platform's template fields are mapped to ROUTE_FIELDS by a declarative field map, a whole table is
+    normalized at once and malformed rows are returned as RouteErrors rather than raised or printed.
+    """
+
+    def __init__(self, field_maps, default_fields) -> None:
+        self.field_maps = field_maps
+        self.default_fields = default_fields
+
+    def columns(self, routes, platform):
+        """Returns the ROUTE_FIELDS columns of a routing table as they were parsed"""
+        field_map = self.field_maps.get(platform, self.default_fields)
+        return {field: routes.column(field_map[field]) for field in ROUTE_FIELDS}
+
+    def normalize(self, routes, platform):
+        columns = self.columns(routes, platform)
+        count = len(routes.rows)
+        addresses = np.zeros(count, dtype=np.uint32)
+        prefixlens = np.zeros(count, dtype=np.uint8)
+        valid = np.zeros(count, dtype=bool)
+        errors = []
+        for row, (network, mask) in enumerate(zip(columns["network"], columns["mask"])):
+            try:
+                addresses[row], prefixlens[row] = parse_ipv4_network(network, mask)
+            except ValueError as e:
+                errors.append(RouteError(row, network, mask, str(e)))
+            else:
+                valid[row] = True
+        return NormalizedRoutes(
+            **columns,
+            addresses=addresses,
+            prefixlens=prefixlens,
+            valid=valid,
+            errors=errors,
+        )
+
+
+route_normalizer = RouteNormalizer(ROUTE_FIELD_MAPS, DEFAULT_ROUTE_FIELDS)
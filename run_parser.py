@@ -1,378 +1,666 @@
-import re
-import ipaddress
-import pandas as pd
+import argparse
 import json
-from sys import exit, platform
-from csv import DictWriter, writer
-from tabulate import tabulate
-from config_parser import DeviceConfigParser
-from config_parser import FileHandler
-from config_parser import CommandSlicer
+import time
+from sys import exit, platform, stdout
+from aggregate_index import AggregateIndex
+from profiler import profiler
 from glob import glob
-from operator import itemgetter
-from rich import print
+from console import CONSOLE_MODES, console, error, print
 from constants import FILE_TYPES, COMMAND_LIST
+from shards import shard_spec
 
-# Load public aggregates data and convert to IP Objects
-try:
-    with open("vars/public_aggregates.json") as f:
-        public_aggregates = json.load(f)
-except Exception as e:
-    print(
-        f"[bold red]Failed to load aggregate classification from public_aggregates.json"
-    )
-    print("[bold red]Error Details: ", e.__class__)
+# Modules pulling in asyncio, numpy, pandas, openpyxl or TextFSM are imported by the stage that needs them,
+# so importing this module, --help and runs that stop early start quickly
+
+# Columns added to the records of ARP and MAC tables
+RECORD_COLUMNS = ["device", "platform", "source", "site", "file"]
+
+ROUTE_ERROR_COLUMNS = [
+    "device",
+    "platform",
+    "site",
+    "file",
+    "row",
+    "network",
+    "mask",
+    "error",
+]
+
+
+def count_type(minimum):
+    """argparse type of an integer option that must be at least minimum"""
+
+    def count(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{value} is not a whole number")
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"{value} must be at least {minimum}")
+        return number
+
+    return count
 
-# Function to generate reports
-def csv_export(file_name, report_dict, friendly_description):
+
+def load_aggregate_index(file_name="vars/public_aggregates.json"):
+    """Loads public aggregates data and indexes them for overlap classification"""
     try:
-        with open(file_name, "w", newline="") as csvfile:
-            writer = DictWriter(csvfile, fieldnames=report_dict[0].keys())
-            writer.writeheader()
-            for report_row in report_dict:
-                writer.writerow(report_row)
-        print(f'\n[bold green]File "{file_name}" has been successfully created\n')
+        with open(file_name) as f:
+            public_aggregates = json.load(f)
     except Exception as e:
-        print("Ouch!", e.__class__, "occurred.")
-    # Print Output to Console in Table Format
-    if report_dict:
-        print(f"\n[bold red]{friendly_description}:\n")
-        print(tabulate(report_dict, headers="keys", tablefmt="github"))
-        print("\n" * 2)
-    else:
-        print(f"[bold red]No {friendly_description} found!")
-
-
-# Search directory for relevant file types
-files_found = []  # List of dictionaries
-for file_type in FILE_TYPES:
-    files_found.extend(glob(file_type))
-
-# Primary Data Models
-sites = []  # List
-devices = []  # List of Device Objects.
-"""
-Example Device Search:
-next((device for device in devices if device["name"] == "ROUTER1"), False)
-"""
-
-# Dict device_name: Dict of lists containing dict of keys("command_found","sliced_command_output")
-command_contents = {}
-
-files_missing_device_name = []  # List of strings
-files_missing_site_name = []  # List of strings
-files_missing_network_interface_addresses = []  # List of dictionaries
-# TODO TextFSM_parsing_errors = []  # List of dictionaries
-
-# Gather data from files
-if files_found:
-    for orig_file in files_found:
-        # Parse site name from filename
-        match_site_name = re.search(r".*\/(.*) -", orig_file)
-        if match_site_name is not None:
-            site_name = match_site_name.group(1)
-            sites.append(site_name)
+        public_aggregates = {}
+        error(
+            f"[bold red]Failed to load aggregate classification from public_aggregates.json"
+        )
+        error("[bold red]Error Details: ", e.__class__)
+    return AggregateIndex(public_aggregates)
+
+
+def write_profile(trace_file):
+    """Prints the profile summary of the run and writes its Chrome trace
+
+    The summary is what --profile asks for, so it is printed in every console mode: as plain text in quiet
+    mode and as one "profile" record per table in json mode.
+    """
+    for title, table in profiler.summary():
+        if console.mode == "json":
+            console.log("profile", title=title, table=table)
+        elif console.mode == "quiet":
+            stdout.write(f"\n{title}:\n\n{table}\n")
         else:
-            site_name = ""
-            files_missing_site_name.append(orig_file[6:])
-        contents = FileHandler(orig_file)
-        # Searches every file for commands that we intend to parse
-        for ref_file, content in contents.name.items():
-            if isinstance(content, bytes):
-                content = content.decode("utf-8")
-            commands_sliced = CommandSlicer(
-                orig_file, ref_file, site_name, content, COMMAND_LIST
+            print(f"\n[bold red]{title}:\n")
+            print(table)
+    profiler.write_trace(trace_file)
+    print(f'\n[bold green]Profile trace "{trace_file}" has been successfully created\n')
+
+
+def main(argv=None):
+    """Runs the parser with command line arguments, sys.argv when argv is None"""
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(
+        description="Parses network device configuration and state captures into IPAM reports"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=count_type(0),
+        default=1,
+        help="number of worker processes used to parse files (0 uses every core, default: 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every file even if an unchanged copy was parsed by a previous run",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".parse_cache",
+        help="directory holding cached parse results (default: .parse_cache)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="size in MB the parse cache is trimmed to after each run (default: 1024)",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="only parse files that are new or changed since the previous incremental run",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=".parser_state.sqlite",
+        help="SQLite database holding the records of previous incremental runs (default: .parser_state.sqlite)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile_trace.json",
+        metavar="TRACE_FILE",
+        help="time every stage, file and template, print a summary and write a Chrome trace (default: profile_trace.json)",
+    )
+    parser.add_argument(
+        "--console",
+        choices=CONSOLE_MODES,
+        default="rich",
+        help="console output: rendered with rich, quiet (errors only) or json (one log record per line) (default: rich)",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        dest="console",
+        action="store_const",
+        const="quiet",
+        help="same as --console quiet",
+    )
+    parser.add_argument(
+        "--preview-rows",
+        type=int,
+        default=20,
+        help="rows of each report printed to the console (default: 20)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["xlsx", "parquet", "arrow"],
+        default="xlsx",
+        help="format the reports are written in next to the CSV files: an XLSX workbook, or Parquet or Arrow IPC datasets with typed columns (default: xlsx)",
+    )
+    parser.add_argument(
+        "--conflict-routes",
+        action="store_true",
+        help="also check routing table networks against interface networks for duplicates and overlaps",
+    )
+    parser.add_argument(
+        "--snapshot",
+        nargs="?",
+        const="snapshots",
+        metavar="SNAPSHOT_DIR",
+        help="save the datasets of this run as a snapshot and report what changed since the previous one (default: snapshots)",
+    )
+    parser.add_argument(
+        "--fleet-index",
+        nargs="?",
+        const="fleet_index.sqlite",
+        metavar="INDEX_FILE",
+        help="index every address, MAC address and hostname for fleet_index.py lookups (default: fleet_index.sqlite)",
+    )
+    parser.add_argument(
+        "--dataset-dir",
+        default="ipam_datasets",
+        help="directory the Parquet or Arrow datasets are written to (default: ipam_datasets)",
+    )
+    sharding = parser.add_argument_group(
+        "sharding",
+        "split a run across nodes: each node parses one shard of the input files and writes a partial result, "
+        "merging the partials of every shard writes the reports of a single run",
+    )
+    sharding.add_argument(
+        "--shard",
+        type=shard_spec,
+        metavar="K/N",
+        help="parse shard K of N of the input files and write its partial result instead of reports",
+    )
+    sharding.add_argument(
+        "--partial-file",
+        metavar="PATH",
+        help="partial result written by --shard (default: partials/shard-K-of-N.partial)",
+    )
+    sharding.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="PARTIAL",
+        help="write the reports of the partial results of shard runs instead of parsing the input folder",
+    )
+    collection = parser.add_argument_group(
+        "collection",
+        "parse captures while they are being collected; each capture is sent as a first line holding its "
+        'file name (for example "SITEA - switch1.log") followed by the raw output',
+    )
+    collection.add_argument(
+        "--listen",
+        metavar="[HOST:]PORT",
+        help="accept one capture per TCP connection",
+    )
+    collection.add_argument(
+        "--fifo", metavar="PATH", help="read one capture per writer from a named pipe"
+    )
+    collection.add_argument(
+        "--replay",
+        type=float,
+        nargs="?",
+        const=0.0,
+        metavar="DELAY",
+        help="replay the input folder through the collection pipeline, pausing DELAY seconds per 64 KB",
+    )
+    collection.add_argument(
+        "--max-captures",
+        type=count_type(1),
+        help="stop collecting after this many captures",
+    )
+    collection.add_argument(
+        "--idle-timeout",
+        type=float,
+        help="stop collecting when no capture arrived for this many seconds",
+    )
+    collection.add_argument(
+        "--collect-concurrency",
+        type=count_type(1),
+        default=16,
+        help="captures collected at the same time (default: 16)",
+    )
+    collection.add_argument(
+        "--queue-size",
+        type=count_type(1),
+        default=32,
+        help="collected captures waiting to be parsed before collection is held back (default: 32)",
+    )
+    args = parser.parse_args(argv)
+    if args.shard and (
+        args.merge or args.listen or args.fifo or args.replay is not None
+    ):
+        parser.error(
+            "--shard cannot be combined with --merge, --listen, --fifo or --replay"
+        )
+    if args.merge and (args.listen or args.fifo or args.replay is not None):
+        parser.error("--merge cannot be combined with --listen, --fifo or --replay")
+    console.set_mode(args.console)
+    if args.profile:
+        profiler.enable()
+    cache = None
+    if not args.no_cache:
+        from parse_cache import ParseCache
+
+        cache = ParseCache(args.cache_dir, max_bytes=args.cache_size * 1024**2)
+    state = None
+    if args.incremental:
+        from state_store import StateStore
+
+        state_file = args.state_file
+        if args.shard and state_file == parser.get_default("state_file"):
+            # Shards retire the files of other shards from their state, each keeps its own
+            state_file = ".parser_state-{}-of-{}.sqlite".format(*args.shard)
+        state = StateStore(state_file, COMMAND_LIST)
+
+    # Primary Data Models
+    # sites: List, devices: List of Device Objects.
+    # command_contents: Dict device_name: Dict of command: sliced_command_output
+    # Devices, addresses and MAC addresses are searched with fleet_index.py once indexed (--fleet-index)
+    if args.merge:
+        from shards import merge_partials
+
+        try:
+            sites, devices, command_contents, files_missing_site_name = merge_partials(
+                args.merge, COMMAND_LIST, jobs=args.jobs, cache=cache
+            )
+        except (OSError, ValueError) as e:
+            error("Ouch!", e.__class__, "occurred.", e)
+            exit(1)
+    elif args.listen or args.fifo:
+        import asyncio
+        from async_ingest import fifo_captures, ingest_captures, socket_captures
+
+        # Parse captures as they are collected instead of searching the input folder
+        if args.listen:
+            host, _, port = args.listen.rpartition(":")
+            captures = socket_captures(
+                host or "127.0.0.1", int(port), args.max_captures, args.idle_timeout
             )
-            if commands_sliced.commands_found:
-                command_contents[
-                    commands_sliced.command_hostname
-                ] = commands_sliced.commands_found
-        # Populate devices data model based on running config
-        for ref_file, content in contents.name.items():
-            if isinstance(content, bytes):
-                content = content.decode("utf-8")
-            device = DeviceConfigParser(
-                orig_file, ref_file, site_name, content, **command_contents
+        else:
+            captures = fifo_captures(args.fifo, args.max_captures, args.idle_timeout)
+        sites, devices, command_contents, files_missing_site_name = asyncio.run(
+            ingest_captures(
+                captures,
+                COMMAND_LIST,
+                jobs=args.jobs,
+                concurrency=args.collect_concurrency,
+                queue_size=args.queue_size,
             )
-            devices.append(device)
-else:
-    print(f"[bold red] No Files Found for the Following Paths: {FILE_TYPES}")
-    exit(1)
-
-
-# Data Models
-device_details = []  # List of dictionaries
-interface_ips = []  # List of dictionaries
-route_networks = []  # List of dictionaries
-route_details = []  # List of dictionaries
-arp_details = []  # List of dictionaries
-mac_details = []  # List of dictionaries
-
-# Reports
-network_report_interfaces = []  # List of dictionaries
-networks_combined = []  # List of dictionaries
-
-# Evaluate each device to capture data models
-for device in devices:
-    if device.missing_hostname:
-        files_missing_device_name.append(device.ref_file)
-    if device.missing_networks:
-        files_missing_network_interface_addresses.append(
-            {"Device Name": device.name, "File Name": device.ref_file}
         )
-    # Populate device report if config is valid
-    if device.missing_hostname == False and device.missing_networks == False:
-        device_dict = {}
-        device_dict["device"] = device.name
-        device_dict["platform"] = device.platform
-        device_dict["routing_table"] = True if device.routes else False
-        device_dict["arp_table"] = True if device.arp else False
-        device_dict["mac_table"] = True if device.macs else False
-        device_dict["dhcp_server"] = device.dhcp_server
-        device_dict["nat"] = device.nat
-        device_dict["site"] = device.site
-        device_dict["file"] = device.ref_file
-        device_details.append(device_dict)
-    # Populate interfaces data model
-    for interface in device.sorted_int_addresses:
-        interface_dict = {}
-        interface_dict["int_address"] = interface
-        interface_dict["ip_network"] = interface.network
-        interface_dict["device"] = device.name
-        interface_dict["site"] = device.site
-        interface_dict["file"] = device.ref_file
-        interface_dict["platform"] = device.platform
-        interface_dict["source"] = "interface"
-        if public_aggregates and interface.network.with_prefixlen != "0.0.0.0/0":
-            interface_dict["public_overlap"] = "No Issue"
-            interface_dict["public_overlap_cidr"] = ""
-            route_aggregate_found = False
-            for category in public_aggregates.keys():
-                for aggregate in public_aggregates[category]:
-                    if interface.network.overlaps(ipaddress.ip_network(aggregate)):
-                        interface_dict["public_overlap"] = category
-                        interface_dict["public_overlap_cidr"] = aggregate
-                        break
-                if route_aggregate_found:
-                    break
-        else:
-            interface_dict["public_overlap"] = "No Issue"
-            interface_dict["public_overlap_cidr"] = ""
-        interface_ips.append(interface_dict)
-    # Populate routes data model
-    for route in device.route_networks:
-        routes_dict = {}
-        routes_dict["ip_network"] = route
-        routes_dict["device"] = device.name
-        routes_dict["site"] = device.site
-        routes_dict["file"] = device.ref_file
-        routes_dict["platform"] = device.platform
-        routes_dict["source"] = "routing_table"
-        if public_aggregates and route.with_prefixlen != "0.0.0.0/0":
-            routes_dict["public_overlap"] = "No Issue"
-            routes_dict["public_overlap_cidr"] = ""
-            public_aggregate_found = False
-            for category in public_aggregates.keys():
-                for aggregate in public_aggregates[category]:
-                    if route.overlaps(ipaddress.ip_network(aggregate)):
-                        routes_dict["public_overlap"] = category
-                        routes_dict["public_overlap_cidr"] = aggregate
-                        break
-                if public_aggregate_found:
-                    break
+    else:
+        # Search directory for relevant file types
+        files_found = []  # List of dictionaries
+        for file_type in FILE_TYPES:
+            # Sorted, so every run and every shard node numbers the files alike
+            files_found.extend(sorted(glob(file_type)))
+
+        # Gather data from files
+        if not files_found:
+            error(f"[bold red] No Files Found for the Following Paths: {FILE_TYPES}")
+            exit(1)
+        if args.replay is not None:
+            import asyncio
+            from async_ingest import ingest_captures, replay_captures
+
+            sites, devices, command_contents, files_missing_site_name = asyncio.run(
+                ingest_captures(
+                    replay_captures(files_found, delay=args.replay),
+                    COMMAND_LIST,
+                    jobs=args.jobs,
+                    concurrency=args.collect_concurrency,
+                    queue_size=args.queue_size,
+                )
+            )
+        elif args.shard:
+            from shards import partial_file_name, run_shard
+
+            partial = run_shard(
+                files_found,
+                *args.shard,
+                COMMAND_LIST,
+                jobs=args.jobs,
+                cache=cache,
+                state=state,
+            )
+            if state is not None:
+                state.close()
+            partial_file = args.partial_file or partial_file_name(*args.shard)
+            partial.write(partial_file)
+            print(
+                f'\n[bold green]Partial result "{partial_file}" has been successfully created, '
+                "merge the partials of every shard with --merge to write the reports\n"
+            )
+            console.log(
+                "shard",
+                shard=partial.shard,
+                shards=partial.shards,
+                files=len(partial.files),
+                partial=partial_file,
+                seconds=round(time.perf_counter() - started, 3),
+            )
+            if args.profile:
+                write_profile(args.profile)
+            return
         else:
-            routes_dict["public_overlap"] = "No Issue"
-            routes_dict["public_overlap_cidr"] = ""
-        route_networks.append(routes_dict)
-    # Populate route details data model
-    if device.routes:
-        for route_detail in device.routes:
-            route_details_dict = {}
-            if device.platform == "hp_comware":
-                route_details_dict["protocol"] = route_detail["protocal"]
-                route_details_dict["network"] = route_detail.get("network")
-                route_details_dict["mask"] = route_detail.get("mask")
-                route_details_dict["nexthop_ip"] = route_detail.get("nexthop_ip")
-            if device.platform == "cisco_ios":
-                route_details_dict["protocol"] = route_detail.get("protocol")
-                route_details_dict["network"] = route_detail.get("network")
-                route_details_dict["mask"] = route_detail.get("mask")
-                route_details_dict["nexthop_ip"] = route_detail.get("nexthop_ip")
-            if device.platform == "checkpoint_gaia":
-                route_details_dict["protocol"] = route_detail["protocol"]
-                route_details_dict["network"] = route_detail.get("network")
-                route_details_dict["mask"] = route_detail.get("mask")
-                route_details_dict["nexthop_ip"] = route_detail.get("nexthopip")
-            route_details_dict["device"] = device.name
-            route_details_dict["platform"] = device.platform
-            route_details_dict["source"] = "routing_table"
-            route_details_dict["site"] = device.site
-            route_details_dict["file"] = device.ref_file
-            route_details.append(route_details_dict)
-    # Populate arp data model
-    if device.arp:
-        for arp in device.arp:
-            arp_dict = {**arp}
-            arp_dict["device"] = device.name
-            arp_dict["platform"] = device.platform
-            arp_dict["source"] = "arp_table"
-            arp_dict["site"] = device.site
-            arp_dict["file"] = device.ref_file
-            arp_details.append(arp_dict)
-    # Populate macs data model
-    if device.macs:
-        for mac in device.macs:
-            mac_dict = {**mac}
-            mac_dict["device"] = device.name
-            mac_dict["platform"] = device.platform
-            mac_dict["source"] = "mac_table"
-            mac_dict["site"] = device.site
-            mac_dict["file"] = device.ref_file
-            mac_details.append(mac_dict)
-
-# Populate data structure for network interfaces report
-for network in sorted(interface_ips, key=itemgetter("int_address")):
-    int_network_dict = {}
-    int_network_dict["Header-Network"] = "Network"
-    int_network_dict["address"] = network[
-        "int_address"
-    ].network.network_address.exploded
-    int_network_dict["netmask"] = network["int_address"].netmask.exploded
-    int_network_dict["description"] = ""
-    int_network_dict["device"] = network["device"]
-    int_network_dict["interface_ip"] = network["int_address"].compressed
-    int_network_dict["platform"] = network["platform"]
-    int_network_dict["site"] = network["site"]
-    int_network_dict["public_overlap"] = network.get("public_overlap")
-    int_network_dict["public_overlap_cidr"] = network.get("public_overlap_cidr")
-    int_network_dict["is_private"] = network["int_address"].network.is_private
-    int_network_dict["is_loopback"] = network["int_address"].network.is_loopback
-    int_network_dict["is_reserved"] = network["int_address"].network.is_reserved
-    int_network_dict["file"] = network["file"]
-    network_report_interfaces.append(int_network_dict)
-
-
-# Open XLSX File for Exporting
-xlsx_writer = pd.ExcelWriter("ipam_report.xlsx")
-
-# Export Networks (Interfaces) to CSV in InfoBlox Format and Print to Console
-csv_export("networks_from_int.csv", network_report_interfaces, "Networks Found")
-pd_network_report_interfaces = pd.DataFrame(network_report_interfaces)
-pd_network_report_interfaces.to_excel(
-    xlsx_writer,
-    sheet_name="Network Subnets - Interfaces",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-
-# Combine the interface and routing data models for consolidated report (all networks)
-networks_combined_list = [*interface_ips, *route_networks]
-
-# Populate data structure for all networks report
-for network in sorted(networks_combined_list, key=itemgetter("ip_network")):
-    all_network_dict = {}
-    all_network_dict["Header-Network"] = "Network"
-    all_network_dict["address"] = network["ip_network"].network_address.exploded
-    all_network_dict["netmask"] = network["ip_network"].netmask.exploded
-    all_network_dict["description"] = ""
-    all_network_dict["device"] = network["device"]
-    all_network_dict["source"] = network["source"]
-    all_network_dict["platform"] = network["platform"]
-    all_network_dict["site"] = network["site"]
-    all_network_dict["public_overlap"] = network.get("public_overlap")
-    all_network_dict["public_overlap_cidr"] = network.get("public_overlap_cidr")
-    all_network_dict["is_private"] = network["ip_network"].is_private
-    all_network_dict["is_loopback"] = network["ip_network"].is_loopback
-    all_network_dict["is_reserved"] = network["ip_network"].is_reserved
-    all_network_dict["file"] = network["file"]
-    networks_combined.append(all_network_dict)
-
-
-# Export Networks to CSV in InfoBlox Format and Print to Console
-csv_export("networks_combined.csv", networks_combined, "Networks Found")
-pd_networks_combined = pd.DataFrame(networks_combined)
-pd_networks_combined.to_excel(
-    xlsx_writer,
-    sheet_name="Network Subnets - All",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-# Export Route Details to CSV in InfoBlox Format and Print to Console
-csv_export("route_details.csv", route_details, "Route Details")
-pd_route_details = pd.DataFrame(route_details)
-pd_route_details.to_excel(
-    xlsx_writer,
-    sheet_name="Routing Tables",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-# Export ARP Details to CSV in InfoBlox Format and Print to Console
-csv_export(
-    "arp_details.csv",
-    sorted(arp_details, key=lambda ip: (ipaddress.ip_address(ip["ipaddress"]))),
-    "ARP Addresses",
-)
-pd_arp_details = pd.DataFrame(
-    sorted(arp_details, key=lambda ip: (ipaddress.ip_address(ip["ipaddress"])))
-)
-pd_arp_details.to_excel(
-    xlsx_writer,
-    sheet_name="ARP Tables",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-# Export MAC Details to CSV in InfoBlox Format and Print to Console
-csv_export("mac_details.csv", mac_details, "MAC Addresses")
-pd_mac_details = pd.DataFrame(mac_details)
-pd_mac_details.to_excel(
-    xlsx_writer,
-    sheet_name="Mac Tables",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-# Export Device Details to CSV in InfoBlox Format and Print to Console
-csv_export("device_details.csv", device_details, "Device Details")
-pd_device_details = pd.DataFrame(device_details)
-pd_device_details.to_excel(
-    xlsx_writer,
-    sheet_name="Device Details",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-
-csv_export(
-    "files_missing_network_interface_addresses.csv",
-    files_missing_network_interface_addresses,
-    "Device configuration is either missing, redacted, or no interface IP addressing was contained within the following files",
-)
-pd_files_missing_network_interface_addresses = pd.DataFrame(
-    files_missing_network_interface_addresses
-)
-pd_files_missing_network_interface_addresses.to_excel(
-    xlsx_writer,
-    sheet_name="Missing Interface Addresses",
-    index=False,
-    freeze_panes=(1, 0),
-)
-
-xlsx_writer.close()
-
-# Print list of files missing site names
-if files_missing_site_name:
-    print("\n[bold red]No site names were found for the following files:\n")
-    for ref_file in files_missing_site_name:
-        print(f"{ref_file}")
-    print("\n\n")
-
-# Print files missing a device name (Goal is 0)
-if files_missing_device_name:
-    print("\n[bold red]No hostname could be identified for the following files:\n")
-    for ref_file in files_missing_device_name:
-        print(f"{ref_file}")
-    print("\n\n")
+            from file_processor import process_files
+
+            sites, devices, command_contents, files_missing_site_name = process_files(
+                files_found, COMMAND_LIST, jobs=args.jobs, cache=cache, state=state
+            )
+            if state is not None:
+                state.close()
+
+    files_missing_device_name = []  # List of strings
+    # TODO TextFSM_parsing_errors = []  # List of dictionaries
+
+    from endpoint_inventory import ENDPOINT_COLUMNS, address_sort_key
+    from endpoint_inventory import MacLocations, endpoint_rows
+    from fleet_index import ARP_ADDRESS_FIELDS, first_field
+    from network_conflicts import CONFLICT_COLUMNS, find_conflicts
+    from network_table import INTERFACE_COLUMNS, NETWORK_COLUMNS
+    from network_table import NetworkTable, NetworkTableBuilder
+    from report_writer import ReportDatasets, ReportWorkbook, ReportWriter
+    from report_writer import table_columns
+    from route_normalizer import ROUTE_FIELDS, route_normalizer
+
+    route_detail_columns = [
+        *ROUTE_FIELDS,
+        "device",
+        "platform",
+        "source",
+        "site",
+        "file",
+    ]
+
+    # Reports stream their rows to CSV and to a write-only XLSX workbook (or datasets) as they are produced
+    if args.format == "xlsx":
+        workbook = ReportWorkbook("ipam_report.xlsx")
+    else:
+        try:
+            workbook = ReportDatasets(args.dataset_dir, args.format)
+        except ImportError as e:
+            error(f"[bold red]{e}, install it or use --format xlsx")
+            exit(1)
+    interface_report = ReportWriter(
+        "networks_from_int.csv",
+        "Networks Found",
+        workbook.sheet("Network Subnets - Interfaces"),
+        INTERFACE_COLUMNS,
+        preview_rows=args.preview_rows,
+    )
+    networks_report = ReportWriter(
+        "networks_combined.csv",
+        "Networks Found",
+        workbook.sheet("Network Subnets - All"),
+        NETWORK_COLUMNS,
+        preview_rows=args.preview_rows,
+    )
+    route_report = ReportWriter(
+        "route_details.csv",
+        "Route Details",
+        workbook.sheet("Routing Tables"),
+        preview_rows=args.preview_rows,
+    )
+    arp_report = ReportWriter(
+        "arp_details.csv",
+        "ARP Addresses",
+        workbook.sheet("ARP Tables"),
+        preview_rows=args.preview_rows,
+    )
+    endpoint_report = ReportWriter(
+        "endpoints.csv",
+        "Endpoints",
+        workbook.sheet("Endpoints"),
+        ENDPOINT_COLUMNS,
+        preview_rows=args.preview_rows,
+    )
+    mac_report = ReportWriter(
+        "mac_details.csv",
+        "MAC Addresses",
+        workbook.sheet("Mac Tables"),
+        preview_rows=args.preview_rows,
+    )
+    device_report = ReportWriter(
+        "device_details.csv",
+        "Device Details",
+        workbook.sheet("Device Details"),
+        preview_rows=args.preview_rows,
+    )
+    missing_addresses_report = ReportWriter(
+        "files_missing_network_interface_addresses.csv",
+        "Device configuration is either missing, redacted, or no interface IP addressing was contained within the following files",
+        workbook.sheet("Missing Interface Addresses"),
+        preview_rows=args.preview_rows,
+    )
+    conflicts_report = ReportWriter(
+        "network_conflicts.csv",
+        "Network Conflicts",
+        workbook.sheet("Network Conflicts"),
+        CONFLICT_COLUMNS,
+        preview_rows=args.preview_rows,
+    )
+    route_errors_report = ReportWriter(
+        "route_errors.csv",
+        "Malformed Routes",
+        fieldnames=ROUTE_ERROR_COLUMNS,
+        preview_rows=args.preview_rows,
+    )
+
+    # Data Models
+    interface_ips = NetworkTableBuilder()  # Columnar table of interface networks
+    route_networks = NetworkTableBuilder()  # Columnar table of routed networks
+    arp_details = []  # List of dictionaries, sorted by address before export
+
+    # Platforms parse ARP and MAC tables with different templates, their reports hold every field of each
+    arp_columns = table_columns([device.arp for device in devices], RECORD_COLUMNS)
+    if arp_columns:
+        arp_report.write_header(arp_columns)
+    mac_columns = table_columns([device.macs for device in devices], RECORD_COLUMNS)
+    if mac_columns:
+        mac_report.write_header(mac_columns)
+
+    with profiler.span("device records", "run", devices=len(devices)):
+        # Evaluate each device to capture data models
+        for device in devices:
+            if device.missing_hostname:
+                files_missing_device_name.append(device.ref_file)
+            if device.missing_networks:
+                missing_addresses_report.write(
+                    {"Device Name": device.name, "File Name": device.ref_file}
+                )
+            # Populate device report if config is valid
+            if device.missing_hostname == False and device.missing_networks == False:
+                device_dict = {}
+                device_dict["device"] = device.name
+                device_dict["platform"] = device.platform
+                device_dict["routing_table"] = True if device.routes else False
+                device_dict["arp_table"] = True if device.arp else False
+                device_dict["mac_table"] = True if device.macs else False
+                device_dict["dhcp_server"] = device.dhcp_server
+                device_dict["nat"] = device.nat
+                device_dict["site"] = device.site
+                device_dict["file"] = device.ref_file
+                device_report.write(device_dict)
+            # Populate interfaces data model
+            for interface in device.sorted_int_addresses:
+                interface_ips.add_interface(interface, device)
+            # Normalize the routing table in one batch, driven by the platform's field map
+            routes = route_normalizer.normalize(device.routes, device.platform)
+            # Populate routes data model
+            route_networks.add_networks(4, *routes.sorted_networks(), device)
+            # Export route details
+            if device.routes:
+                if route_report.fieldnames is None:
+                    route_report.write_header(route_detail_columns)
+                route_source = (
+                    device.name,
+                    device.platform,
+                    "routing_table",
+                    device.site,
+                    device.ref_file,
+                )
+                for route_detail in routes.details():
+                    route_report.write_values((*route_detail, *route_source))
+            for route_error in routes.errors:
+                route_errors_report.write_values(
+                    (
+                        device.name,
+                        device.platform,
+                        device.site,
+                        device.ref_file,
+                        *route_error,
+                    )
+                )
+            # Populate arp data model
+            if device.arp:
+                for arp_dict in device.arp.records():
+                    arp_dict["device"] = device.name
+                    arp_dict["platform"] = device.platform
+                    arp_dict["source"] = "arp_table"
+                    arp_dict["site"] = device.site
+                    arp_dict["file"] = device.ref_file
+                    arp_details.append(arp_dict)
+            # Export MAC details
+            if device.macs:
+                for mac_dict in device.macs.records():
+                    mac_dict["device"] = device.name
+                    mac_dict["platform"] = device.platform
+                    mac_dict["source"] = "mac_table"
+                    mac_dict["site"] = device.site
+                    mac_dict["file"] = device.ref_file
+                    mac_report.write(mac_dict)
+
+    # Export ARP details sorted once by integer address, the endpoint inventory follows the same order
+    arp_details.sort(
+        key=lambda arp_dict: address_sort_key(first_field(arp_dict, ARP_ADDRESS_FIELDS))
+    )
+    for arp_dict in arp_details:
+        arp_report.write(arp_dict)
+
+    # Locate every ARP entry on the switch port its MAC address was learned on, in one hash join
+    with profiler.span(endpoint_report.file_name, "endpoints"):
+        endpoint_report.write_rows(endpoint_rows(arp_details, MacLocations(devices)))
+
+    # Classify every network once, the interface and combined reports share the results
+    interface_table = interface_ips.build()
+    route_table = route_networks.build()
+    networks_table = NetworkTable.concat([interface_table, route_table])
+    with profiler.span("classify_public_overlap", "public_overlap"):
+        networks_table.classify_public_overlap(load_aggregate_index())
+    with profiler.span("classify_address_types", "address_types"):
+        networks_table.classify_address_types()
+
+    # Export Networks (Interfaces) in InfoBlox Format
+    with profiler.span(interface_report.file_name, "report"):
+        interface_table = NetworkTable(
+            networks_table.frame.iloc[: len(interface_table)]
+        )
+        interface_report.write_rows(
+            interface_table.sorted(by_address=True).report_rows(INTERFACE_COLUMNS)
+        )
+
+    # Export Networks (Interfaces and Routing Tables) in InfoBlox Format
+    with profiler.span(networks_report.file_name, "report"):
+        networks_report.write_rows(networks_table.sorted().report_rows(NETWORK_COLUMNS))
+
+    # Export networks held by more than one device, found in a single sort-and-sweep pass
+    with profiler.span(conflicts_report.file_name, "conflicts"):
+        conflicts_report.write_rows(
+            find_conflicts(networks_table if args.conflict_routes else interface_table)
+        )
+
+    # Save the datasets of this run and report what changed since the previous snapshot
+    drift_report = None
+    if args.snapshot:
+        from drift import DRIFT_COLUMNS, Snapshot, latest_snapshot, write_drift
+
+        try:
+            previous_snapshot = latest_snapshot(args.snapshot)
+            with profiler.span(args.snapshot, "snapshot", devices=len(devices)):
+                snapshot = Snapshot.write(devices, args.snapshot)
+            print(
+                f'\n[bold green]Snapshot "{snapshot.path}" has been successfully created\n'
+            )
+            if previous_snapshot is None:
+                snapshot.close()
+            else:
+                drift_report = ReportWriter(
+                    "drift_report.csv",
+                    "Changes Since The Previous Snapshot",
+                    workbook.sheet("Drift"),
+                    DRIFT_COLUMNS,
+                    preview_rows=args.preview_rows,
+                )
+                with profiler.span(drift_report.file_name, "drift"):
+                    write_drift(Snapshot(previous_snapshot), snapshot, drift_report)
+        except Exception as e:
+            error("Ouch!", e.__class__, "occurred.")
+
+    # Close the reports and print a preview of each to the console
+    for report in (
+        interface_report,
+        networks_report,
+        route_report,
+        arp_report,
+        endpoint_report,
+        mac_report,
+        device_report,
+        missing_addresses_report,
+        conflicts_report,
+        route_errors_report,
+        drift_report,
+    ):
+        if report is not None:
+            report.close()
+    workbook.close()
+
+    if args.fleet_index:
+        from fleet_index import FleetIndex
+
+        with profiler.span(args.fleet_index, "index", devices=len(devices)):
+            try:
+                FleetIndex.build(devices, args.fleet_index).close()
+                print(
+                    f'\n[bold green]Fleet index "{args.fleet_index}" has been successfully created\n'
+                )
+            except Exception as e:
+                error("Ouch!", e.__class__, "occurred.")
+
+    # Print list of files missing site names
+    if files_missing_site_name:
+        error("\n[bold red]No site names were found for the following files:\n")
+        for ref_file in files_missing_site_name:
+            error(f"{ref_file}")
+        error("\n\n")
+
+    # Print files missing a device name (Goal is 0)
+    if files_missing_device_name:
+        error("\n[bold red]No hostname could be identified for the following files:\n")
+        for ref_file in files_missing_device_name:
+            error(f"{ref_file}")
+        error("\n\n")
+
+    console.log(
+        "run",
+        devices=len(devices),
+        sites=len(set(sites)),
+        seconds=round(time.perf_counter() - started, 3),
+    )
+
+    if args.profile:
+        write_profile(args.profile)
+
+
+if __name__ == "__main__":
+    main()
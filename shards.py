@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import os
+import pickle
+import zlib
+from operator import itemgetter
+from console import error, print
+from constants import PARSER_VERSION
+
+
+def shard_spec(value):
+    """Parses a K/N command line argument into (K, N), shards being numbered from 1"""
+    try:
+        shard, shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not K/N, for example 1/4")
+    if not 1 <= shard <= shards:
+        raise argparse.ArgumentTypeError(f"{value}: K must be between 1 and N")
+    return shard, shards
+
+
+def shard_of(orig_file, shards):
+    """Shard (1 to shards) a file belongs to, by a hash of its path that is the same on every node"""
+    digest = hashlib.sha256(orig_file.encode("utf-8", "surrogatepass")).digest()
+    return int.from_bytes(digest[:8], "big") % shards + 1
+
+
+def partial_file_name(shard, shards, directory="partials"):
+    return os.path.join(directory, f"shard-{shard}-of-{shards}.partial")
+
+
+def parser_signature(command_list):
+    from parse_cache import template_set_version
+
+    # Partials sliced or parsed by another parser, template set or command list cannot be merged
+    return "\n".join([str(PARSER_VERSION), template_set_version(), *command_list])
+
+
+class PartialResult:
+    """Records of the files of one shard, written by a shard run and combined by merge_partials
+
+    Files are numbered by their position in the full file list. Members keep the commands sliced from
+    each file and the devices without their commands, so the merge can hand a device the commands of a
+    file in another shard. Command parses done by the shard are kept with the digest of the commands
+    they were given and reused whenever the merge hands a device the same commands.
+    """
+
+    def __init__(self, shard, shards, signature, files, members, parses) -> None:
+        self.shard = shard
+        self.shards = shards
+        self.signature = signature
+        self.files = files  # [(file_index, orig_file)]
+        # [(file_index, member_index, command_hostname, commands_found, device)]
+        self.members = members
+        # {(file_index, member_index): (commands digest, (routes, arp, macs))}
+        self.parses = parses
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(**pickle.loads(zlib.decompress(f.read())))
+
+    def write(self, path):
+        """Saves the partial result to path, replacing it once completely written"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        building = f"{path}.building"
+        with open(building, "wb") as f:
+            f.write(
+                zlib.compress(
+                    pickle.dumps(vars(self), protocol=pickle.HIGHEST_PROTOCOL), 1
+                )
+            )
+        os.replace(building, path)
+
+
+def run_shard(files_found, shard, shards, command_list, jobs=1, cache=None, state=None):
+    """Slices and parses the files of one shard of files_found, returning its PartialResult
+
+    Devices are parsed with the commands found in the files of the shard, as a run over those files alone
+    would. Every node must list the same files in the same order.
+    """
+    from file_processor import process_members
+
+    files = [
+        (file_index, orig_file)
+        for file_index, orig_file in enumerate(files_found)
+        if shard_of(orig_file, shards) == shard
+    ]
+    print(
+        f"\n[bold green]Shard {shard} of {shards}: {len(files)} of {len(files_found)} files\n"
+    )
+    _, _, members, _, _, parses = process_members(
+        [orig_file for _, orig_file in files], command_list, jobs, cache, state
+    )
+    # Files are renumbered from their position in the shard to their position in files_found
+    file_indexes = [file_index for file_index, _ in files]
+    return PartialResult(
+        shard,
+        shards,
+        parser_signature(command_list),
+        files,
+        [(file_indexes[member[0]], *member[1:]) for member in members],
+        {
+            (file_indexes[file_index], member_index): parse
+            for (file_index, member_index), parse in parses.items()
+        },
+    )
+
+
+def merge_partials(paths, command_list, jobs=1, cache=None):
+    """Combines the partial results of shard runs into the (sites, devices, command_contents,
+    files_missing_site_name) of a run over all their files
+
+    Members of every shard are replayed in file order, so each device is handed the commands a single
+    run would have given it. Devices given the commands their shard parsed keep that parse, only devices
+    whose commands come from a file of another shard are parsed again.
+    """
+    from file_processor import TaskPool, match_commands, parse_site_name
+
+    signature = parser_signature(command_list)
+    partials = {}
+    shards = None
+    for path in paths:
+        partial = PartialResult.load(path)
+        if partial.signature != signature:
+            raise ValueError(
+                f"{path} was written by another parser version, template set or command list"
+            )
+        if shards is not None and partial.shards != shards:
+            raise ValueError(
+                f"{path} is a shard of {partial.shards}, other partials are shards of {shards}"
+            )
+        if partial.shard in partials:
+            raise ValueError(f"Shard {partial.shard} of {shards} was given twice")
+        shards = partial.shards
+        partials[partial.shard] = partial
+    missing = sorted(set(range(1, shards + 1)) - set(partials)) if shards else []
+    if missing:
+        error(
+            f"[bold yellow]Shards {', '.join(map(str, missing))} of {shards} are missing, their files are left out"
+        )
+
+    files = sorted(
+        (file for partial in partials.values() for file in partial.files),
+        key=itemgetter(0),
+    )
+    members = sorted(
+        (member for partial in partials.values() for member in partial.members),
+        key=itemgetter(0, 1),
+    )
+    shard_parses = {}
+    for partial in partials.values():
+        shard_parses.update(partial.parses)
+
+    sites = []
+    files_missing_site_name = []
+    for _, orig_file in files:
+        site_name = parse_site_name(orig_file)
+        if site_name is not None:
+            sites.append(site_name)
+        else:
+            files_missing_site_name.append(orig_file[6:])
+
+    def stored_commands(file_index, member_index, digest):
+        parse = shard_parses.get((file_index, member_index))
+        if parse is not None and parse[0] == digest:
+            return parse[1]
+        return None
+
+    pool = TaskPool(jobs)
+    try:
+        devices, command_contents, parses = match_commands(
+            members, pool, cache, stored_commands
+        )
+    finally:
+        pool.close()
+    reparsed = sum(
+        shard_parses.get(key, (None,))[0] != digest
+        for key, (digest, _) in parses.items()
+    )
+    print(
+        f"\n[bold green]{len(partials)} shards merged: {len(files)} files, {len(devices)} devices, "
+        f"{reparsed} devices parsed with commands from other shards\n"
+    )
+    if cache is not None:
+        cache.evict()
+    return sites, devices, command_contents, files_missing_site_name
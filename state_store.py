@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+from constants import PARSER_VERSION
+from parse_cache import template_set_version
+
+
+def file_digest(path, chunk_size=1024**2):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def commands_digest(platform, commands):
+    """Hashes the inputs of a device's command parse: its platform and the sliced command output"""
+    digest = hashlib.sha256(str(platform).encode())
+    for command, output in commands.items():
+        for part in (command, output):
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+class StateStore:
+    """SQLite store of the files seen by previous runs and the device records extracted from them
+
+    Each file is fingerprinted by size and modification time, backed by a SHA-256 of its contents so a file
+    that was only touched is not parsed again. The sliced commands and device of every file or zip member
+    are stored with the parsed routes, ARP and MAC tables, so unchanged files are never reopened.
+    """
+
+    def __init__(self, path=".parser_state.sqlite", command_list=()) -> None:
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                orig_file TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT
+            );
+            CREATE TABLE IF NOT EXISTS members (
+                orig_file TEXT, member_index INTEGER, record BLOB,
+                PRIMARY KEY (orig_file, member_index)
+            );
+            CREATE TABLE IF NOT EXISTS parsed (
+                orig_file TEXT, member_index INTEGER, commands_digest TEXT, record BLOB,
+                PRIMARY KEY (orig_file, member_index)
+            );
+            """)
+        # Records extracted by another parser, template set or command list are discarded
+        signature = "\n".join(
+            [str(PARSER_VERSION), template_set_version(), *command_list]
+        )
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'signature'"
+        ).fetchone()
+        if row is None or row[0] != signature:
+            self.db.executescript(
+                "DELETE FROM files; DELETE FROM members; DELETE FROM parsed;"
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,)
+            )
+
+    def fingerprint(self, orig_file):
+        stat = os.stat(orig_file)
+        return stat.st_size, stat.st_mtime_ns
+
+    def stored_members(self, orig_file, fingerprint):
+        """Returns [(member_index, command_hostname, commands_found, device)] if orig_file is unchanged, else None"""
+        row = self.db.execute(
+            "SELECT size, mtime_ns, digest FROM files WHERE orig_file = ?",
+            (orig_file,),
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, digest = row
+        if fingerprint != (size, mtime_ns):
+            if fingerprint[0] != size or file_digest(orig_file) != digest:
+                return None
+            self.db.execute(
+                "UPDATE files SET mtime_ns = ? WHERE orig_file = ?",
+                (fingerprint[1], orig_file),
+            )
+        return [
+            (member_index, *pickle.loads(record))
+            for member_index, record in self.db.execute(
+                "SELECT member_index, record FROM members WHERE orig_file = ? ORDER BY member_index",
+                (orig_file,),
+            )
+        ]
+
+    def record_file(self, orig_file, fingerprint, members):
+        """Replaces the members stored for orig_file, unless it changed since it was fingerprinted"""
+        if self.fingerprint(orig_file) != fingerprint:
+            self.retire_file(orig_file)
+            return
+        self.retire_file(orig_file)
+        self.db.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?)",
+            (orig_file, *fingerprint, file_digest(orig_file)),
+        )
+        self.db.executemany(
+            "INSERT INTO members VALUES (?, ?, ?)",
+            [
+                (
+                    orig_file,
+                    member_index,
+                    pickle.dumps(member, protocol=pickle.HIGHEST_PROTOCOL),
+                )
+                for member_index, *member in members
+            ],
+        )
+
+    def stored_commands(self, orig_file, member_index, digest):
+        """Returns the stored (routes, arp, macs) of a device if its command output is unchanged"""
+        row = self.db.execute(
+            "SELECT commands_digest, record FROM parsed WHERE orig_file = ? AND member_index = ?",
+            (orig_file, member_index),
+        ).fetchone()
+        if row is None or row[0] != digest:
+            return None
+        return pickle.loads(row[1])
+
+    def record_commands(self, orig_file, member_index, digest, parsed):
+        self.db.execute(
+            "INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)",
+            (
+                orig_file,
+                member_index,
+                digest,
+                pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL),
+            ),
+        )
+
+    def retire_file(self, orig_file):
+        for table in ("files", "members", "parsed"):
+            self.db.execute(f"DELETE FROM {table} WHERE orig_file = ?", (orig_file,))
+
+    def retire(self, current_files):
+        """Removes every file not in current_files, returning how many were retired"""
+        current_files = set(current_files)
+        retired = [
+            orig_file
+            for (orig_file,) in self.db.execute("SELECT orig_file FROM files")
+            if orig_file not in current_files
+        ]
+        for orig_file in retired:
+            self.retire_file(orig_file)
+        return len(retired)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,157 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+from profiler import profiler
+
+
+class ParsedTable(namedtuple("ParsedTable", ["header", "rows"])):
+    """Parsed command output: a header of lowercased field names and a tuple of value tuples per record"""
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    @classmethod
+    def from_records(cls, records):
+        if not records:
+            return EMPTY_TABLE
+        header = tuple(records[0])
+        return cls(
+            header,
+            tuple(tuple(record.get(key) for key in header) for record in records),
+        )
+
+    def records(self):
+        """Yields each record as a dict of field name: value"""
+        for row in self.rows:
+            yield dict(zip(self.header, row))
+
+    def column(self, name):
+        """Returns the values of a field, None for each record when the template has no such field"""
+        if name not in self.header:
+            return (None,) * len(self.rows)
+        index = self.header.index(name)
+        return tuple(row[index] for row in self.rows)
+
+
+EMPTY_TABLE = ParsedTable((), ())
+
+
+@lru_cache(maxsize=None)
+def textfsm_modules():
+    """(ntc_templates.parse, textfsm, clitable), imported by the first parse rather than at startup
+
+    textfsm and clitable are None where TextFSM is not supported (Windows), parse_output reports it.
+    """
+    from ntc_templates import parse as ntc_parse
+
+    try:
+        import textfsm
+        from textfsm import clitable
+    except ImportError:
+        textfsm = clitable = None
+    return ntc_parse, textfsm, clitable
+
+
+@lru_cache(maxsize=None)
+def template_dir():
+    """Folder of the NTC Templates: NTC_TEMPLATES_DIR when set, as for parse_output, else the templates
+    shipped with the ntc_templates package
+    """
+    directory = os.environ.get("NTC_TEMPLATES_DIR")
+    if directory is None:
+        import ntc_templates
+
+        directory = os.path.join(os.path.dirname(ntc_templates.__file__), "templates")
+    return directory
+
+
+@lru_cache(maxsize=None)
+def template_index():
+    """The NTC Templates index, read and compiled once per process"""
+    _, _, clitable = textfsm_modules()
+    return clitable.CliTable("index", template_dir())
+
+
+@lru_cache(maxsize=256)
+def template_names(platform, command):
+    """Resolves the template file names for a (platform, command) pair, None when no template matches"""
+    index = template_index().index
+    row_index = index.GetRowMatch({"Command": command, "Platform": platform})
+    if not row_index:
+        return None
+    return tuple(index.index[row_index]["Template"].split(":"))
+
+
+@lru_cache(maxsize=128)
+def compiled_template(template_name):
+    """Builds the TextFSM state machine of a template once, it is reset before every parse"""
+    _, textfsm, _ = textfsm_modules()
+    with profiler.span(template_name, "compile"):
+        with open(os.path.join(template_dir(), template_name)) as template:
+            fsm = textfsm.TextFSM(template)
+    header = tuple(value.lower() for value in fsm.header)
+    return fsm, header
+
+
+def compile_template(platform, command):
+    """Compiles the template of a (platform, command) pair ahead of parsing, so compile and parse time
+    are recorded as separate stages
+    """
+    _, _, clitable = textfsm_modules()
+    if clitable is None:
+        return
+    names = template_names(platform, command)
+    if names is not None and len(names) == 1:
+        compiled_template(names[0])
+
+
+def parse(platform, command, data):
+    """Drop-in replacement for ntc_templates.parse.parse_output using memoized templates
+
+    Index lookups and compiled templates are cached per process. Commands mapped to several templates,
+    whose tables are merged on their keys, are left to parse_output.
+    """
+    ntc_parse, _, clitable = textfsm_modules()
+    if clitable is None:
+        return ntc_parse.parse_output(platform=platform, command=command, data=data)
+    names = template_names(platform, command)
+    if names is None:
+        raise Exception(
+            'Unable to parse command "{0}" on platform {1} - {2}'.format(
+                command,
+                platform,
+                'No template found for attributes: "%s"'
+                % {"Command": command, "Platform": platform},
+            )
+        )
+    if len(names) > 1:
+        return ntc_parse.parse_output(platform=platform, command=command, data=data)
+    fsm, header = compiled_template(names[0])
+    fsm.Reset()
+    return [dict(zip(header, record)) for record in fsm.ParseText(data)]
+
+
+def parse_table(platform, command, data):
+    """Parses command output into a ParsedTable, records are kept as tuples rather than dicts"""
+    _, _, clitable = textfsm_modules()
+    if clitable is None:
+        return ParsedTable.from_records(parse(platform, command, data))
+    names = template_names(platform, command)
+    if names is None or len(names) > 1:
+        return ParsedTable.from_records(parse(platform, command, data))
+    fsm, header = compiled_template(names[0])
+    fsm.Reset()
+    return ParsedTable(header, tuple(map(tuple, fsm.ParseText(data))))
+
+
+def parse_batch(platform, command, outputs):
+    """Parses many outputs of the same command, returning a result or the exception raised for each"""
+    results = []
+    for data in outputs:
+        try:
+            results.append(parse(platform, command, data))
+        except Exception as e:
+            results.append(e)
+    return results
@@ -0,0 +1,36 @@
+from config_parser import parse_device_config
+from network_table import NetworkTableBuilder
+
+COLUMNS = ["address", "netmask", "device", "interface_ip", "is_private", "file"]
+
+
+def test_ipv6_interface_row():
+    device = parse_device_config(
+        "input/",
+        "input/A - sw1.txt",
+        "A",
+        "sysname SW1\n"
+        "interface Vlan-interface10\n"
+        " ip address 10.0.2.1 255.255.255.0\n"
+        " ipv6 address 2001:DB8:2::1/64\n"
+        " ipv6 address FE80::1 link-local\n",
+    )
+    builder = NetworkTableBuilder()
+    for interface in device.sorted_int_addresses:
+        builder.add_interface(interface, device)
+    table = builder.build()
+    table.classify_address_types()
+
+    rows = list(table.sorted(by_address=True).report_rows(COLUMNS))
+    # Link-local addresses have no prefix length and are not reported
+    assert rows == [
+        ("10.0.2.0", "255.255.255.0", "SW1", "10.0.2.1/24", True, "A - sw1.txt"),
+        (
+            "2001:0db8:0002:0000:0000:0000:0000:0000",
+            "ffff:ffff:ffff:ffff:0000:0000:0000:0000",
+            "SW1",
+            "2001:db8:2::1/64",
+            True,
+            "A - sw1.txt",
+        ),
+    ]
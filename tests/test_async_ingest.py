@@ -0,0 +1,88 @@
+import asyncio
+import time
+from collections import namedtuple
+import async_ingest
+from async_ingest import Capture, ingest_captures
+from config_parser import decode_capture
+
+Device = namedtuple("Device", "name")
+
+
+def test_collection_waits_for_parsing(monkeypatch):
+    concurrency = 4
+    queue_size = 4
+    started = 0
+    taken = 0
+    held = []
+
+    async def chunks():
+        nonlocal started
+        started += 1
+        held.append(started - taken)
+        yield b"hostname SW\n"
+
+    async def captures():
+        for index in range(40):
+            yield Capture(f"SITE - capture-{index}.txt", chunks())
+
+    def parse_site_name(ref_file):
+        # Called as soon as a parser takes a capture off the queue
+        nonlocal taken
+        taken += 1
+        return "SITE"
+
+    def slow_slice_capture(task):
+        time.sleep(0.01)
+        return "SW", {}, Device(task[0])
+
+    monkeypatch.setattr(async_ingest, "parse_site_name", parse_site_name)
+    monkeypatch.setattr(async_ingest, "slice_capture", slow_slice_capture)
+    sites, devices, _, _ = asyncio.run(
+        ingest_captures(
+            captures(), [], jobs=1, concurrency=concurrency, queue_size=queue_size
+        )
+    )
+
+    assert len(devices) == 40
+    assert max(held) <= concurrency + queue_size
+
+
+def test_streams_are_decoded_as_files(monkeypatch):
+    raw = "sysname SW\r\ndisplay arp\r\n".encode("utf-16")
+    contents = []
+
+    async def chunks():
+        # Split within a UTF-16 code unit
+        yield raw[:5]
+        yield raw[5:]
+
+    async def captures():
+        yield Capture("SITE - sw.log", chunks())
+
+    def record_slice_capture(task):
+        contents.append(task[2])
+        return "SW", {}, Device(task[0])
+
+    monkeypatch.setattr(async_ingest, "slice_capture", record_slice_capture)
+    asyncio.run(ingest_captures(captures(), [], jobs=1))
+
+    assert contents == [decode_capture(raw, translate_newlines=True)]
+    assert contents == ["sysname SW\ndisplay arp\n"]
+
+
+def test_negative_jobs_still_start_a_parser(monkeypatch):
+    async def chunks():
+        yield b"hostname SW\n"
+
+    async def captures():
+        for index in range(3):
+            yield Capture(f"SITE - capture-{index}.txt", chunks())
+
+    monkeypatch.setattr(
+        async_ingest, "slice_capture", lambda task: ("SW", {}, Device(task[0]))
+    )
+    _, devices, _, _ = asyncio.run(
+        asyncio.wait_for(ingest_captures(captures(), [], jobs=-1, queue_size=1), 10)
+    )
+
+    assert len(devices) == 3
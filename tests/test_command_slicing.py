@@ -0,0 +1,46 @@
+from config_parser import slice_commands
+from constants import COMMAND_LIST
+
+ROUTES = """\
+Gateway of last resort is 10.0.0.1 to network 0.0.0.0
+S*    0.0.0.0/0 [1/0] via 10.0.0.1->Gi0/1
+C     10.0.0.0/24 is directly connected, GigabitEthernet0/1
+"""
+
+
+def test_prompt_at_line_start_slices_until_the_next_prompt():
+    output = f"RTR1#show ip route\n{ROUTES}RTR1#show clock\n*10:00:00 UTC Mon\n"
+
+    hostname, commands = slice_commands(output, COMMAND_LIST)
+
+    assert hostname == "RTR1"
+    # Blocks closed by a prompt end before the newline of their last line
+    assert commands == {"show ip route": ROUTES[:-1]}
+
+
+def test_comware_prompt():
+    arp = "IP address      MAC address    VLAN  Interface\n10.1.0.5  0050-56aa-0001  10  GE1/0/5\n"
+    output = f"<SW1>display arp\n{arp}<SW1>quit\n"
+
+    hostname, commands = slice_commands(output, COMMAND_LIST)
+
+    assert hostname == "SW1"
+    assert commands == {"display arp": arp[:-1]}
+
+
+def test_prompt_marker_inside_command_output_does_not_end_the_block():
+    # "->" holds a prompt marker but is not a prompt line
+    output = f"admin@MX1> show route\n{ROUTES}"
+
+    hostname, commands = slice_commands(output, COMMAND_LIST)
+
+    assert hostname == "MX1"
+    assert commands == {"show route": ROUTES}
+
+
+def test_first_block_of_each_command_is_kept():
+    output = "RTR1#show ip route\nfirst\nRTR1#show ip route\nsecond\n"
+
+    _, commands = slice_commands(output, COMMAND_LIST)
+
+    assert commands == {"show ip route": "first"}
@@ -0,0 +1,69 @@
+import pytest
+from config_parser import PLATFORM_SIGNATURES, config_scanner
+
+CONFIGURATIONS = {
+    "checkpoint_gaia": (
+        "set hostname FW1\n"
+        "set interface eth0 ipv4-address 10.0.0.1 mask-length 24\n"
+        "set interface eth0 ipv6-address 2001:db8::1 mask-length 64\n"
+    ),
+    "juniper_junos": (
+        "set system host-name MX1\n"
+        "set interfaces ge-0/0/0 unit 0 family inet address 10.0.1.1/24\n"
+        "set interfaces ge-0/0/0 unit 0 family inet6 address 2001:db8:1::1/64\n"
+    ),
+    "hp_comware": (
+        "sysname SW1\n"
+        "interface Vlan-interface10\n"
+        " ip address 10.0.2.1 255.255.255.0\n"
+        " ipv6 address 2001:DB8:2::1/64\n"
+    ),
+    "cisco_ios": (
+        "hostname RTR1\n"
+        "interface GigabitEthernet0/1\n"
+        " ip address 10.0.3.1 255.255.255.0\n"
+        " ipv6 address 2001:db8:3::1/64\n"
+        " ip nat inside\n"
+    ),
+}
+
+EXPECTED = {
+    "checkpoint_gaia": ("FW1", ["10.0.0.1/24", "2001:db8::1/64"], set()),
+    "juniper_junos": ("MX1", ["10.0.1.1/24", "2001:db8:1::1/64"], set()),
+    "hp_comware": ("SW1", ["10.0.2.1/24", "2001:db8:2::1/64"], set()),
+    "cisco_ios": ("RTR1", ["10.0.3.1/24", "2001:db8:3::1/64"], {"nat"}),
+}
+
+
+def test_every_signature_has_a_configuration():
+    assert [platform for platform, _, _ in PLATFORM_SIGNATURES] == list(CONFIGURATIONS)
+
+
+@pytest.mark.parametrize("platform", list(CONFIGURATIONS))
+def test_platform_is_detected(platform):
+    scan = config_scanner.scan(CONFIGURATIONS[platform])
+
+    name, addresses, features = EXPECTED[platform]
+    assert scan.platform == platform
+    assert scan.name == name
+    assert not scan.missing_hostname
+    assert [str(interface) for interface in scan.int_addresses] == addresses
+    assert scan.features == features
+
+
+def test_unknown_platform_reads_checkpoint_addresses():
+    scan = config_scanner.scan(
+        "admin@FW9> show configuration\n"
+        "set interface eth0 ipv4-address 10.0.9.1 mask-length 24\n"
+        " ip address 10.0.8.1 255.255.255.0\n"
+    )
+
+    assert (scan.name, scan.platform) == ("FW9", "checkpoint_gaia")
+    assert [str(interface) for interface in scan.int_addresses] == ["10.0.9.1/24"]
+
+
+def test_no_hostname():
+    scan = config_scanner.scan("nothing to see here\n")
+
+    assert scan.missing_hostname
+    assert scan.platform == "No platform detected"
@@ -0,0 +1,21 @@
+import json
+from console import Console
+
+
+def test_quiet_mode_writes_errors_only(capsys):
+    console = Console("quiet")
+    console.print("[bold green]Parsed 3 files")
+    console.error("[bold red]No Files Found")
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err == "No Files Found\n"
+
+
+def test_json_mode_logs_errors(capsys):
+    console = Console("json")
+    console.error("Ouch!", KeyError, "occurred.")
+
+    record = json.loads(capsys.readouterr().out)
+    assert record["event"] == "error"
+    assert record["message"] == "Ouch! <class 'KeyError'> occurred."
@@ -0,0 +1,70 @@
+from config_parser import DeviceRecord
+from endpoint_inventory import ENDPOINT_COLUMNS, MacLocations, endpoint_rows
+from template_engine import EMPTY_TABLE, ParsedTable
+
+MAC_HEADER = ("destination_address", "vlan", "destination_port")
+
+
+def switch(name, site, macs):
+    return DeviceRecord(
+        ref_file=f"{site} - {name}.log",
+        site=site,
+        name=name,
+        missing_hostname=False,
+        platform="hp_comware",
+        int_addresses=(),
+        missing_networks=True,
+        dhcp_server=False,
+        nat=False,
+        routes=EMPTY_TABLE,
+        arp=EMPTY_TABLE,
+        macs=ParsedTable(MAC_HEADER, tuple(macs)),
+    )
+
+
+def arp_entry(address, mac, vlan, device, site):
+    return {
+        "ipaddress": address,
+        "macaddress": mac,
+        "vlan": vlan,
+        "interface": f"Vlan{vlan}",
+        "device": device,
+        "site": site,
+    }
+
+
+def test_virtual_mac_is_located_at_its_own_site():
+    # Both sites run VRRP group 1, so their gateways share the virtual MAC address
+    virtual_mac = "0000-5e00-0101"
+    devices = [
+        switch("SW-B", "B", [(virtual_mac, "20", "GE1/0/1")]),
+        switch(
+            "SW-A",
+            "A",
+            [
+                (virtual_mac, "10", "GE1/0/24"),
+                ("0000-5e00-0102", "10", "GE1/0/24"),
+                ("0000-5e00-0103", "10", "GE1/0/24"),
+            ],
+        ),
+    ]
+    arp_details = [
+        arp_entry("10.1.0.1", virtual_mac, "10", "SW-A", "A"),
+        arp_entry("10.2.0.1", virtual_mac, "20", "SW-B", "B"),
+        arp_entry("10.3.0.1", virtual_mac, "30", "RTR-C", "C"),
+    ]
+
+    rows = [
+        dict(zip(ENDPOINT_COLUMNS, row))
+        for row in endpoint_rows(arp_details, MacLocations(devices))
+    ]
+
+    assert [(row["device"], row["interface"], row["vlan"]) for row in rows[:2]] == [
+        ("SW-A", "GE1/0/24", "10"),
+        ("SW-B", "GE1/0/1", "20"),
+    ]
+    assert [row["site"] for row in rows[:2]] == ["A", "B"]
+    assert not rows[0]["ambiguous"] and not rows[1]["ambiguous"]
+    # Site C has no MAC table holding it, the fleet wide match is flagged
+    assert rows[2]["source"] == "mac_table"
+    assert rows[2]["ambiguous"]
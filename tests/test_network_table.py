@@ -0,0 +1,27 @@
+import ipaddress
+from collections import namedtuple
+from network_table import NetworkTableBuilder
+
+Device = namedtuple("Device", "name site ref_file platform")
+
+
+def test_ipv4_classification_does_not_depend_on_the_interpreter():
+    device = Device("RTR1", "A", "A - rtr1.txt", "cisco_ios")
+    networks = [
+        "10.1.0.0/24",
+        "192.0.0.64/26",
+        "192.0.0.9/32",
+        "8.8.8.0/24",
+        "127.0.0.1/32",
+        "240.1.0.0/16",
+    ]
+    builder = NetworkTableBuilder()
+    for network in map(ipaddress.IPv4Network, networks):
+        builder.add(4, int(network.network_address), network.prefixlen, device, "x")
+    table = builder.build()
+    table.classify_address_types()
+
+    frame = table.frame
+    assert frame["is_private"].tolist() == [True, True, False, False, True, True]
+    assert frame["is_loopback"].tolist() == [False] * 4 + [True, False]
+    assert frame["is_reserved"].tolist() == [False] * 5 + [True]
@@ -0,0 +1,30 @@
+import file_processor
+from file_processor import slice_member
+from parse_cache import ParseCache
+
+CAPTURE = "hostname RTR1\ninterface Gi0/1\n ip address 10.0.3.1 255.255.255.0\n"
+
+
+def test_cache_hit_takes_the_file_and_site_names(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "input").mkdir()
+    for name in ("A - rtr1.txt", "B - rtr1 copy.txt"):
+        (tmp_path / "input" / name).write_text(CAPTURE)
+    cache = ParseCache(str(tmp_path / "cache"))
+
+    first = slice_member(
+        (0, 0, "input/A - rtr1.txt", "input/A - rtr1.txt", "A", [], cache)
+    )
+
+    def parse_device_config(*args):
+        raise AssertionError("the capture was parsed again")
+
+    monkeypatch.setattr(file_processor, "parse_device_config", parse_device_config)
+    second = slice_member(
+        (1, 0, "input/B - rtr1 copy.txt", "input/B - rtr1 copy.txt", "B", [], cache)
+    )
+
+    device = second[4]
+    assert second[:2] == (1, 0)
+    assert (device.ref_file, device.site) == ("B - rtr1 copy.txt", "B")
+    assert device._replace(ref_file="A - rtr1.txt", site="A") == first[4]
@@ -0,0 +1,33 @@
+import threading
+from profiler import ProfiledTask, profiler
+
+
+def test_task_events_stay_with_their_task(monkeypatch):
+    monkeypatch.setattr(profiler, "events", [])
+    monkeypatch.setattr(profiler, "task_events", threading.local())
+    monkeypatch.setattr(profiler, "enabled", True)
+    started = threading.Event()
+    recorded = threading.Event()
+
+    def task(name):
+        with profiler.span(name, "slice"):
+            started.set()
+            recorded.wait(5)
+        return name
+
+    worker_result = []
+    worker = threading.Thread(
+        target=lambda: worker_result.append(ProfiledTask(task)("worker"))
+    )
+    worker.start()
+    started.wait(5)
+    # Recorded by another thread while the task is running
+    with profiler.span("collect", "collect"):
+        pass
+    recorded.set()
+    worker.join()
+
+    result, events = worker_result[0]
+    assert result == "worker"
+    assert [event["name"] for event in events] == ["worker"]
+    assert [event["name"] for event in profiler.events] == ["collect"]
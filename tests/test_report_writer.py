@@ -0,0 +1,90 @@
+import csv
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from endpoint_inventory import ENDPOINT_COLUMNS
+from network_conflicts import CONFLICT_COLUMNS
+from report_writer import ReportDatasets, ReportWriter, table_columns
+from template_engine import EMPTY_TABLE, ParsedTable
+
+
+def test_parquet_endpoint_columns_are_typed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    datasets = ReportDatasets("datasets", "parquet")
+    report = ReportWriter(
+        "endpoints.csv", "Endpoints", datasets.sheet("Endpoints"), ENDPOINT_COLUMNS
+    )
+    report.write_rows(
+        [
+            ("10.1.0.1", "00:00:5e:00:01:01", "SW-A", "GE1/0/24", "10", "A")
+            + ("mac_table", False, 3, "SW-A"),
+            ("10.1.0.2", "00:00:5e:00:01:02", "SW-A", "Vlan10", "10", "A")
+            + ("arp_table", False, None, "SW-A"),
+        ]
+    )
+    report.close()
+    datasets.close()
+
+    schema = pq.read_schema("datasets/endpoints.parquet")
+    assert schema.field("ambiguous").type == pa.bool_()
+    assert schema.field("port_macs").type == pa.int64()
+    assert schema.field("device").type == pa.string()
+    table = pq.read_table("datasets/endpoints.parquet")
+    assert table.column("port_macs").to_pylist() == [3, None]
+
+
+def test_parquet_conflict_counts_are_integers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    datasets = ReportDatasets("datasets", "parquet")
+    report = ReportWriter(
+        "network_conflicts.csv",
+        "Network Conflicts",
+        datasets.sheet("Network Conflicts"),
+        CONFLICT_COLUMNS,
+    )
+    report.write_values(
+        ("duplicate", "10.0.0.0/24", "interface", "SW1", "A", "A - sw1.log")
+        + ("10.0.0.0/24", "SW2; SW3", "B", 2, 1, True)
+    )
+    report.close()
+    datasets.close()
+
+    schema = pq.read_schema("datasets/network_conflicts.parquet")
+    assert schema.field("conflicting_device_count").type == pa.int64()
+    assert schema.field("conflicting_site_count").type == pa.int64()
+    assert schema.field("cross_site").type == pa.bool_()
+
+
+def test_mixed_template_records_keep_every_field(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    comware = ParsedTable(("macaddress", "vlan", "interface"), (("a", "1", "GE1"),))
+    ios = ParsedTable(
+        ("destination_address", "vlan", "destination_port"), (("b", "2", "Gi1"),)
+    )
+    report = ReportWriter(
+        "mac_details.csv",
+        "MAC Addresses",
+        fieldnames=table_columns([EMPTY_TABLE, comware, ios], ["device"]),
+    )
+    for device, table in (("SW1", comware), ("SW2", ios)):
+        for record in table.records():
+            report.write({**record, "device": device})
+    report.close()
+
+    with open("mac_details.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["macaddress", "vlan", "interface", "destination_address"]
+        + ["destination_port", "device"],
+        ["a", "1", "GE1", "", "", "SW1"],
+        ["", "2", "", "b", "Gi1", "SW2"],
+    ]
+
+
+def test_unknown_keys_are_not_dropped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    report = ReportWriter("devices.csv", "Devices")
+    report.write({"device": "SW1"})
+    with pytest.raises(ValueError):
+        report.write({"device": "SW2", "platform": "hp_comware"})
+    report.close()
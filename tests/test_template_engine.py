@@ -0,0 +1,28 @@
+from ntc_templates.parse import parse_output
+from template_engine import parse, parse_table, template_dir
+
+SHOW_IP_ARP = """\
+Protocol  Address          Age (min)  Hardware Addr   Type   Interface
+Internet  10.1.0.1                -   0000.5e00.0101  ARPA   Vlan10
+Internet  10.1.0.25              12   0050.56aa.0001  ARPA   Vlan10
+"""
+
+
+def test_templates_are_read_from_ntc_templates_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("NTC_TEMPLATES_DIR", str(tmp_path))
+    template_dir.cache_clear()
+    try:
+        assert template_dir() == str(tmp_path)
+    finally:
+        template_dir.cache_clear()
+
+
+def test_memoized_parse_matches_parse_output():
+    expected = parse_output(
+        platform="cisco_ios", command="show ip arp", data=SHOW_IP_ARP
+    )
+
+    assert parse("cisco_ios", "show ip arp", SHOW_IP_ARP) == expected
+    table = parse_table("cisco_ios", "show ip arp", SHOW_IP_ARP)
+    assert list(table.records()) == expected
+    assert len(expected) == 2